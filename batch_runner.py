@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# ---------------------------
+# Bulk tool-call runner
+# ---------------------------
+# Streams a JSONL file of {"tool": ..., "args": {...}} lines (an optional "id"
+# is echoed back) through ollama_integration.run_tool on a process pool and
+# writes one JSONL result per input line:
+#   {"line": 1, "id": ..., "tool": ..., "ok": true, "result": {...}, "latency_ms": 0.12}
+#
+#   python batch_runner.py calls.jsonl -o results.jsonl --workers 8
+#   python batch_runner.py calls.jsonl --unordered   # faster, results in completion order
+
+Chunk = List[Tuple[int, str]]
+
+
+def read_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[Chunk]:
+    """Group (line_number, text) pairs into chunks, skipping blank lines."""
+    numbered = ((n, line) for n, line in enumerate(lines, 1) if line.strip())
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_chunk(chunk: Chunk) -> List[Tuple[str, float, bool]]:
+    """Worker side: run every call in the chunk, return (output_line, latency_ms, ok)."""
+    from ollama_integration import run_tool
+
+    out = []
+    for n, line in chunk:
+        record: Dict[str, Any] = {"line": n}
+        start = time.perf_counter()
+        try:
+            call = json.loads(line)
+            tool, args = call["tool"], call.get("args") or {}
+            if "id" in call:
+                record["id"] = call["id"]
+            record["tool"] = tool
+            result = run_tool(tool, args)
+            record["ok"] = bool(result.get("ok", True))
+            record["result"] = result
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            record["ok"] = False
+            record["error"] = f"bad input line: {e}"
+        latency = (time.perf_counter() - start) * 1000.0
+        record["latency_ms"] = round(latency, 3)
+        out.append((json.dumps(record, ensure_ascii=False), latency, record["ok"]))
+    return out
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = array("d")
+        self.errors = 0
+        self.start = time.perf_counter()
+
+    def add(self, latency: float, ok: bool) -> None:
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        lat = sorted(self.latencies)
+        n = len(lat)
+        return {
+            "calls": n,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(n / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "mean": round(sum(lat) / n, 3) if n else 0.0,
+                "p50": round(percentile(lat, 50), 3),
+                "p90": round(percentile(lat, 90), 3),
+                "p99": round(percentile(lat, 99), 3),
+                "max": round(lat[-1], 3) if n else 0.0
+            }
+        }
+
+
+def run_batch(
+    lines: Iterable[str],
+    out,
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+    ordered: bool = True,
+    max_in_flight: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Feed chunks to the pool with at most max_in_flight outstanding, so memory
+    stays bounded however long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    stats = Stats()
+
+    def emit(fut: Future) -> None:
+        for output_line, latency, ok in fut.result():
+            out.write(output_line + "\n")
+            stats.add(latency, ok)
+
+    chunks = read_chunks(lines, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if ordered:
+            queue: Deque[Future] = deque()
+            for chunk in chunks:
+                queue.append(pool.submit(run_chunk, chunk))
+                if len(queue) >= max_in_flight:
+                    emit(queue.popleft())
+            while queue:
+                emit(queue.popleft())
+        else:
+            pending: Set[Future] = set()
+            for chunk in chunks:
+                pending.add(pool.submit(run_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        emit(fut)
+            for fut in wait(pending).done:
+                emit(fut)
+    out.flush()
+    return stats.report()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a JSONL file of tool calls through run_tool")
+    parser.add_argument("input", help="JSONL file of {\"tool\": ..., \"args\": {...}} lines ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="results JSONL file ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="calls sent to a worker at a time")
+    parser.add_argument("--unordered", action="store_true", help="write results in completion order")
+    args = parser.parse_args()
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        report = run_batch(src, dst, workers=args.workers, chunk_size=args.chunk_size, ordered=not args.unordered)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(json.dumps(report, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import data_store
+import functions
+from batch_runner import percentile
+
+# ---------------------------
+# Tool benchmark with a synthetic data generator
+# ---------------------------
+# Generates mock_data.json-shaped catalogues of several sizes, points
+# functions.py at each one and times every read-only tool on it:
+#
+#   python benchmark.py --sizes 1000,10000,100000
+#   python benchmark.py --sizes 10000 --save-baseline bench_baseline.json
+#   python benchmark.py --sizes 10000 --compare bench_baseline.json   # exit 1 on regressions
+#   python benchmark.py --backend sqlite --tools search_foods,review_cart
+#
+# Tools are called directly (not through run_tool), so the tool-result cache
+# does not hide their cost. log_user_preference is skipped (it writes a file).
+
+CATEGORIES = ["bread", "carbs", "protein", "fruit", "dairy", "vegetables", "fast-food", "snacks", "drinks", "cereal"]
+BASE_TAGS = [
+    "high-carb", "processed", "diabetes-friendly", "high-fiber", "high-protein", "low-carb",
+    "heart-healthy", "omega-3", "high-glycemic", "natural-sugar", "fiber", "low-sodium"
+]
+CONDITIONS = ["Diabetes", "Hypertension", "Heart Disease", "Kidney Disease", "Osteoporosis", "High Cholesterol"]
+INGREDIENTS = [
+    "whole wheat flour", "sugar", "salt", "high fructose corn syrup", "partially hydrogenated soybean oil",
+    "sodium benzoate", "water", "oats", "msg", "dextrose", "olive oil", "milk", "sodium nitrite", "yeast"
+]
+_SYLLABLES = ["ka", "mo", "ru", "li", "ta", "ne", "so", "vi", "pa", "do", "ge", "zu", "ra", "mi", "lo", "ba"]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def generate_data(
+    n_foods: int,
+    n_users: int,
+    n_drugs: int,
+    n_tags: int = 50,
+    n_conditions: int = len(CONDITIONS),
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Synthetic catalogue with the same shape as mock_data.json (one meal plan per condition)."""
+    rng = random.Random(seed)
+    tags = BASE_TAGS + [f"tag-{i}" for i in range(max(0, n_tags - len(BASE_TAGS)))]
+    conditions = CONDITIONS[:n_conditions] + [f"Condition {i}" for i in range(max(0, n_conditions - len(CONDITIONS)))]
+
+    foods, seen = [], set()
+    while len(foods) < n_foods:
+        category = rng.choice(CATEGORIES)
+        name = f"{_word(rng)} {category.replace('-', ' ').title()}"
+        if name.lower() in seen:
+            name = f"{name} {len(foods)}"
+        seen.add(name.lower())
+        carbs = rng.randint(0, 80)
+        foods.append({
+            "food_id": len(foods) + 1,
+            "food_name": name,
+            "category": category,
+            "calories": rng.randint(20, 700),
+            "total_carbs": carbs,
+            "sugars": rng.randint(0, carbs),
+            "protein": rng.randint(0, 40),
+            "fiber": rng.randint(0, 12),
+            "sodium": rng.randint(0, 1200),
+            "tags": rng.sample(tags, rng.randint(0, min(3, len(tags))))
+        })
+    names = [f["food_name"] for f in foods]
+
+    drugs = [{
+        "drug_name": f"{_word(rng)}mab {i}",
+        "avoid_foods": rng.sample(names, min(len(names), rng.randint(2, 10))),
+        "notes": "Synthetic interaction note"
+    } for i in range(n_drugs)]
+    drug_names = [d["drug_name"] for d in drugs]
+
+    users = [{
+        "user_id": i + 1,
+        "name": _word(rng),
+        "age": rng.randint(60, 95),
+        "weight": rng.randint(45, 120),
+        "height": rng.randint(145, 190),
+        "gender": rng.choice(["Female", "Male"]),
+        "chronic_diseases": rng.sample(conditions, rng.randint(0, min(2, len(conditions)))),
+        "allergies": rng.sample(names, min(len(names), rng.randint(0, 2))),
+        "medications": rng.sample(drug_names, min(len(drug_names), rng.randint(0, 3)))
+    } for i in range(n_users)]
+
+    meal_plans = [{
+        "condition": c,
+        "breakfast": rng.sample(names, min(len(names), 2)),
+        "lunch": rng.sample(names, min(len(names), 2)),
+        "dinner": rng.sample(names, min(len(names), 2))
+    } for c in conditions]
+
+    return {"foods": foods, "users": users, "drugs": drugs, "meal_plans": meal_plans}
+
+
+def size_config(n_foods: int) -> Dict[str, int]:
+    """Default users / drugs for a catalogue of n_foods foods."""
+    return {"n_foods": n_foods, "n_users": max(3, n_foods // 10), "n_drugs": max(3, n_foods // 100)}
+
+
+# ---------------------------
+# Workloads: tool name -> function building the kwargs of one call
+# ---------------------------
+
+ArgsFactory = Callable[[random.Random], Dict[str, Any]]
+
+
+def workloads(data: Dict[str, Any]) -> Dict[str, Tuple[Callable[..., Dict[str, Any]], ArgsFactory]]:
+    foods = data["foods"]
+    names = [f["food_name"] for f in foods]
+    user_ids = [u["user_id"] for u in data["users"]]
+
+    def typo(name: str, rng: random.Random) -> str:
+        i = rng.randrange(len(name))
+        return name[:i] + name[i + 1:]
+
+    def product(rng: random.Random) -> Dict[str, Any]:
+        f = rng.choice(foods)
+        return {"name": f["food_name"], "carbs": f["total_carbs"], "fiber": f["fiber"],
+                "sugars": f["sugars"], "protein": f["protein"], "glycemic_index": rng.randint(20, 90)}
+
+    def nutrition(rng: random.Random) -> Dict[str, Any]:
+        return {"total_carbs": rng.randint(0, 80), "dietary_fiber": rng.randint(0, 10),
+                "added_sugars": rng.randint(0, 20), "sugars": rng.randint(0, 30), "sodium": rng.randint(0, 900)}
+
+    return {
+        "get_user_profile": (functions.get_user_profile, lambda r: {"user_id": r.choice(user_ids)}),
+        "search_foods": (functions.search_foods, lambda r: {"query": r.choice(names).split()[0][:4]}),
+        "search_foods_exact": (functions.search_foods, lambda r: {"query": r.choice(names)}),
+        "search_foods_fuzzy": (functions.search_foods, lambda r: {"query": typo(r.choice(names), r)}),
+        "check_drug_food_interactions": (
+            functions.check_drug_food_interactions,
+            lambda r: {"user_id": r.choice(user_ids), "food_name": r.choice(names)}
+        ),
+        "check_drug_food_interactions_batch": (
+            functions.check_drug_food_interactions_batch,
+            lambda r: {"user_id": r.choice(user_ids), "food_names": r.sample(names, min(len(names), 20))}
+        ),
+        "check_food_interactions_for_users": (
+            functions.check_food_interactions_for_users,
+            lambda r: {"food_name": r.choice(names), "user_ids": r.sample(user_ids, min(len(user_ids), 20))}
+        ),
+        "suggest_meal_plan_for_user": (functions.suggest_meal_plan_for_user, lambda r: {"user_id": r.choice(user_ids)}),
+        "generate_meal_plan": (functions.generate_meal_plan, lambda r: {"user_id": r.choice(user_ids), "days": 7}),
+        "analyze_product": (functions.analyze_product, lambda r: {"product_name": r.choice(names)}),
+        "analyze_products_batch": (
+            functions.analyze_products_batch,
+            lambda r: {"nutrition_infos": [nutrition(r) for _ in range(100)]}
+        ),
+        "compare_products": (
+            functions.compare_products,
+            lambda r: {"products": [product(r) for _ in range(50)], "top_k": 5}
+        ),
+        "suggest_alternatives": (
+            functions.suggest_alternatives,
+            lambda r: {"original_product": r.choice(names), "category": r.choice(CATEGORIES),
+                       "preferences": r.sample(BASE_TAGS, 1)}
+        ),
+        "calculate_meal_impact": (
+            functions.calculate_meal_impact,
+            lambda r: {"meal_components": [{"food": n, "carbs": r.randint(0, 40)} for n in r.sample(names, min(len(names), 4))]}
+        ),
+        "review_cart": (
+            functions.review_cart,
+            lambda r: {"cart_items": [{"name": n, "quantity": r.randint(1, 3)} for n in r.sample(names, min(len(names), 25))],
+                       "meal_planning": True}
+        ),
+        "check_ingredient_concerns": (
+            functions.check_ingredient_concerns,
+            lambda r: {"ingredients_list": r.sample(INGREDIENTS, 8)}
+        ),
+        "get_portion_guidance": (
+            functions.get_portion_guidance,
+            lambda r: {"food_category": r.choice(CATEGORIES), "food_item": r.choice(names), "meal_context": "dinner"}
+        )
+    }
+
+
+# ---------------------------
+# Timing
+# ---------------------------
+
+def _time_calls(fn: Callable[..., Dict[str, Any]], calls: List[Dict[str, Any]]) -> Tuple[List[float], float, int]:
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for kwargs in calls:
+        t0 = time.perf_counter()
+        result = fn(**kwargs)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if not result.get("ok", True):
+            errors += 1
+    return latencies, time.perf_counter() - start, errors
+
+
+def _peak_kib(fn: Callable[[], Any]) -> float:
+    """Peak traced allocation (KiB) while running fn."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024.0, 1)
+
+
+def bench_size(
+    cfg: Dict[str, int],
+    workdir: str,
+    iterations: int,
+    tools: Optional[List[str]] = None,
+    backend: str = "json",
+    seed: int = 0
+) -> Dict[str, Any]:
+    data = generate_data(cfg["n_foods"], cfg["n_users"], cfg["n_drugs"], seed=seed)
+    path = os.path.join(workdir, f"bench_{cfg['n_foods']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    if backend == "sqlite":
+        import sqlite_store
+        db_path = path[:-len(".json")] + ".db"
+        sqlite_store.import_json(path, db_path)
+        path = db_path
+    elif backend == "snapshot":
+        import snapshot_store
+        snap_path = path[:-len(".json")] + ".snap"
+        snapshot_store.compile_snapshot(path, snap_path)
+        path = snap_path
+
+    old_file = functions.DATA_FILE
+    functions.DATA_FILE = path
+    try:
+        load_start = time.perf_counter()
+        load_kib = _peak_kib(lambda: data_store.get_store(path).index())
+        load_ms = (time.perf_counter() - load_start) * 1000.0
+
+        results: Dict[str, Any] = {}
+        for name, (fn, make_args) in workloads(data).items():
+            if tools and name not in tools:
+                continue
+            rng = random.Random(f"{seed}:{name}")
+            calls = [make_args(rng) for _ in range(iterations)]
+            _time_calls(fn, calls[:max(1, iterations // 10)])  # warm-up (builds lazy indexes)
+            latencies, elapsed, errors = _time_calls(fn, calls)
+            latencies.sort()
+            peak = _peak_kib(lambda: _time_calls(fn, calls[:min(len(calls), 20)]))
+            results[name] = {
+                "calls": len(calls),
+                "errors": errors,
+                "ops_per_s": round(len(calls) / elapsed, 1) if elapsed > 0 else 0.0,
+                "p50_ms": round(percentile(latencies, 50), 4),
+                "p99_ms": round(percentile(latencies, 99), 4),
+                "peak_kib": peak
+            }
+    finally:
+        functions.DATA_FILE = old_file
+        data_store._stores.pop(os.path.abspath(path), None)
+
+    return {"config": cfg, "backend": backend, "load_ms": round(load_ms, 1), "load_peak_kib": load_kib, "tools": results}
+
+
+# ---------------------------
+# Reporting / baselines
+# ---------------------------
+
+def print_report(report: Dict[str, Any], out=sys.stdout) -> None:
+    for size, res in report["sizes"].items():
+        cfg = res["config"]
+        print(
+            f"\n== {size} foods, {cfg['n_users']} users, {cfg['n_drugs']} drugs ({res['backend']}) "
+            f"load {res['load_ms']} ms, peak {res['load_peak_kib']} KiB",
+            file=out
+        )
+        print(f"{'tool':38} {'ops/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'err':>5}", file=out)
+        for name, r in res["tools"].items():
+            print(
+                f"{name:38} {r['ops_per_s']:>11} {r['p50_ms']:>9} {r['p99_ms']:>9} {r['peak_kib']:>9} {r['errors']:>5}",
+                file=out
+            )
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """(size, tool) pairs whose p50 grew by more than `threshold` (0.25 = +25%) over the baseline."""
+    regressions = []
+    for size, res in report["sizes"].items():
+        base_tools = baseline.get("sizes", {}).get(size, {}).get("tools", {})
+        for name, r in res["tools"].items():
+            base = base_tools.get(name)
+            if not base or base["p50_ms"] <= 0:
+                continue
+            ratio = r["p50_ms"] / base["p50_ms"]
+            if ratio > 1.0 + threshold:
+                regressions.append({
+                    "size": size, "tool": name,
+                    "baseline_p50_ms": base["p50_ms"], "p50_ms": r["p50_ms"], "ratio": round(ratio, 2)
+                })
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark functions.py tools on synthetic catalogues")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated food counts")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per tool and size")
+    parser.add_argument("--tools", help="comma-separated subset of workloads to run")
+    parser.add_argument("--backend", choices=("json", "sqlite", "snapshot"), default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_out", help="write the full report to this file")
+    parser.add_argument("--save-baseline", help="save the report as a baseline file")
+    parser.add_argument("--compare", help="baseline file to compare p50 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    tools = [t.strip() for t in args.tools.split(",")] if args.tools else None
+    report: Dict[str, Any] = {"iterations": args.iterations, "seed": args.seed, "sizes": {}}
+    with tempfile.TemporaryDirectory(prefix="seniocare_bench_") as workdir:
+        for n in (int(x) for x in args.sizes.split(",")):
+            report["sizes"][str(n)] = bench_size(
+                size_config(n), workdir, args.iterations, tools=tools, backend=args.backend, seed=args.seed
+            )
+    print_report(report)
+
+    for path in (args.json_out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over +{args.threshold:.0%} p50:", file=sys.stderr)
+            for r in regressions:
+                print(f"  {r['size']:>8} {r['tool']:38} {r['baseline_p50_ms']} -> {r['p50_ms']} ms (x{r['ratio']})",
+                      file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+import argparse
+import asyncio
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from aiohttp import WSMsgType, web
+
+import functions
+import metrics
+import ollama_integration
+from prompt_budget import ConversationHistory
+
+# ---------------------------
+# Multi-session chat server
+# ---------------------------
+# HTTP:
+#   POST   /sessions                     -> {"session_id": ...}
+#   POST   /sessions/{session_id}/messages  {"message": "..."} -> {"answer": ...}
+#   DELETE /sessions/{session_id}
+#   GET    /health
+#   GET    /metrics                      Prometheus text
+#   GET    /metrics.json                 same metrics as JSON
+# WebSocket:
+#   GET /ws  (one session per connection)
+#     send    {"message": "..."}
+#     receive {"type": "token", "data": "..."} ... then {"type": "answer", "data": "..."}
+#             or {"type": "error", "error": "..."}
+
+MAX_SESSIONS = 200
+SESSION_QUEUE_SIZE = 4  # pending messages per session before we push back
+WS_OUTBOX_SIZE = 64  # events queued for one WebSocket client; token chunks are merged beyond this
+HISTORY_TOKENS = ollama_integration.HISTORY_TOKEN_BUDGET  # per session; older turns are summarized
+SESSION_IDLE_TIMEOUT = 30 * 60  # seconds
+TOOL_WORKERS = 8
+DATA_WATCH_INTERVAL = 1.0  # seconds between checks of the data file by the reload thread; 0 = check on every request
+
+
+class SessionBusy(Exception):
+    pass
+
+
+def _message_text(body: Any) -> Optional[str]:
+    """Stripped "message" of a decoded request body, or None if the body is not {"message": str}."""
+    if not isinstance(body, dict):
+        return None
+    message = body.get("message")
+    if message is None:
+        return ""
+    return message.strip() if isinstance(message, str) else None
+
+
+class ChatSession:
+    """
+    One conversation. Messages are queued and answered strictly in order by
+    a single worker task, so history stays consistent; the bounded queue
+    gives backpressure when a client sends faster than the model answers.
+    """
+
+    def __init__(self, session_id: str, queue_size: int, history_tokens: int):
+        self.session_id = session_id
+        self.history = ConversationHistory(max_tokens=history_tokens)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_active = time.monotonic()
+        self._current: Optional[asyncio.Future] = None
+        self._worker = asyncio.create_task(self._run())
+
+    def submit(
+        self, text: str, on_token=None, on_done: Optional[Callable[["asyncio.Future[str]"], None]] = None
+    ) -> "asyncio.Future[str]":
+        """
+        Queue a message. on_done(fut) is called by the worker as soon as fut
+        is settled, before the next message starts, so a streaming client
+        sees each answer right after its own tokens.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((text, on_token, on_done, fut))
+        except asyncio.QueueFull:
+            raise SessionBusy(f"session {self.session_id} has {self.queue.maxsize} messages pending")
+        self.last_active = time.monotonic()
+        return fut
+
+    async def _run(self) -> None:
+        while True:
+            text, on_token, on_done, fut = await self.queue.get()
+            self._current = fut
+            try:
+                answer = await ollama_integration.achat_with_pseudo_tool_calling(
+                    text, on_token=on_token, history=self.history
+                )
+                self.history.add_exchange(text, answer)
+                if not fut.done():
+                    fut.set_result(answer)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                if on_done is not None and fut.done():
+                    on_done(fut)
+                self._current = None
+                self.last_active = time.monotonic()
+                self.queue.task_done()
+
+    async def close(self) -> None:
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        pending = [self._current] if self._current else []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait()[3])
+        for fut in pending:
+            if not fut.done():
+                fut.cancel()
+
+
+class WsOutbox:
+    """
+    Ordered events for one WebSocket, bounded by a queue of `maxsize`.
+    Tokens and answers are emitted synchronously from the session worker and
+    never block the model stream: while the queue is full they wait in
+    `pending`, where consecutive token chunks are merged into one event, so
+    a stalled client holds at most one merged token event and one answer
+    per message in flight.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._room = asyncio.Event()
+
+    def _flush(self) -> None:
+        while self._pending and not self.queue.full():
+            event = self._pending.popleft()
+            if event["type"] == "token":
+                event = {"type": "token", "data": "".join(event["data"])}
+            self.queue.put_nowait(event)
+        if not self._pending:
+            self._room.set()
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self._flush()
+        if not self._pending and not self.queue.full():
+            self.queue.put_nowait(event)
+        elif event["type"] == "token":
+            # pending token chunks are kept as a list and joined once, when queued
+            if self._pending and self._pending[-1]["type"] == "token":
+                self._pending[-1]["data"].append(event["data"])
+            else:
+                self._pending.append({"type": "token", "data": [event["data"]]})
+                self._room.clear()
+        else:
+            self._pending.append(event)
+            self._room.clear()
+
+    async def put(self, event: Dict[str, Any]) -> None:
+        """emit(), then wait until the event is queued (backpressure on the caller)."""
+        self.emit(event)
+        while self._pending:
+            await self._room.wait()
+
+    async def get(self) -> Dict[str, Any]:
+        event = await self.queue.get()
+        self._flush()
+        return event
+
+
+class ChatServer:
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        queue_size: int = SESSION_QUEUE_SIZE,
+        history_tokens: int = HISTORY_TOKENS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        tool_workers: int = TOOL_WORKERS,
+        data_watch_interval: float = DATA_WATCH_INTERVAL
+    ):
+        self.max_sessions = max_sessions
+        self.queue_size = queue_size
+        self.history_tokens = history_tokens
+        self.idle_timeout = idle_timeout
+        self.tool_workers = tool_workers
+        self.data_watch_interval = data_watch_interval
+        self.sessions: Dict[str, ChatSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/sessions", self.handle_create)
+        self.app.router.add_post("/sessions/{session_id}/messages", self.handle_message)
+        self.app.router.add_delete("/sessions/{session_id}", self.handle_delete)
+        self.app.router.add_get("/ws", self.handle_ws)
+        self.app.router.add_get("/health", self.handle_health)
+        self.app.router.add_get("/metrics", self.handle_metrics)
+        self.app.router.add_get("/metrics.json", self.handle_metrics_json)
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+
+    # ---- lifecycle ----
+
+    async def _on_startup(self, app: web.Application) -> None:
+        # run_tool goes through asyncio.to_thread, i.e. the default executor
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.tool_workers, thread_name_prefix="tool")
+        )
+        self._reaper = asyncio.create_task(self._reap_idle())
+        if self.data_watch_interval > 0:
+            # data edits are picked up (and diffed) off the request path
+            await asyncio.to_thread(functions.watch_data_file, self.data_watch_interval)
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+        for sid in list(self.sessions):
+            await self.close_session(sid)
+        await ollama_integration.get_async_client().close()
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout))
+            now = time.monotonic()
+            for sid, s in list(self.sessions.items()):
+                if s.queue.empty() and now - s.last_active > self.idle_timeout:
+                    await self.close_session(sid)
+
+    # ---- sessions ----
+
+    def open_session(self) -> ChatSession:
+        if len(self.sessions) >= self.max_sessions:
+            raise web.HTTPServiceUnavailable(reason="too many sessions")
+        sid = uuid.uuid4().hex
+        session = ChatSession(sid, self.queue_size, self.history_tokens)
+        self.sessions[sid] = session
+        return session
+
+    async def close_session(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        await session.close()
+        return True
+
+    def _get_session(self, request: web.Request) -> ChatSession:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound(reason="unknown session")
+        return session
+
+    # ---- handlers ----
+
+    async def handle_create(self, request: web.Request) -> web.Response:
+        session = self.open_session()
+        return web.json_response({"session_id": session.session_id})
+
+    async def handle_delete(self, request: web.Request) -> web.Response:
+        found = await self.close_session(request.match_info["session_id"])
+        return web.json_response({"ok": found}, status=200 if found else 404)
+
+    async def handle_message(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        try:
+            text = _message_text(await request.json())
+        except ValueError:
+            text = None
+        if text is None:
+            return web.json_response(
+                {"ok": False, "error": 'body must be a JSON object like {"message": "..."}'}, status=400
+            )
+        if not text:
+            return web.json_response({"ok": False, "error": "empty message"}, status=400)
+        try:
+            fut = session.submit(text)
+        except SessionBusy as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=429)
+        try:
+            answer = await fut
+        except Exception as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=502)
+        return web.json_response({"ok": True, "session_id": session.session_id, "answer": answer})
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        session = self.open_session()
+        await ws.send_json({"type": "session", "session_id": session.session_id})
+
+        # everything for this socket is sent, in order, by one task; the
+        # per-session input queue bounds the work in flight and the outbox
+        # the events waiting for a slow client
+        outbox = WsOutbox(WS_OUTBOX_SIZE)
+
+        async def sender() -> None:
+            while True:
+                msg = await outbox.get()
+                await ws.send_json(msg)
+
+        sender_task = asyncio.create_task(sender())
+
+        def on_token(chunk: str) -> None:
+            outbox.emit({"type": "token", "data": chunk})
+
+        def on_done(fut: "asyncio.Future[str]") -> None:
+            if fut.cancelled():
+                return
+            e = fut.exception()
+            outbox.emit({"type": "error", "error": str(e)} if e else {"type": "answer", "data": fut.result()})
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    body = msg.json()
+                except ValueError:
+                    text = msg.data.strip()  # plain text is taken as the message
+                else:
+                    text = _message_text(body)
+                    if text is None:
+                        await outbox.put({"type": "error", "error": 'send {"message": "..."} or plain text'})
+                        continue
+                if not text:
+                    continue
+                try:
+                    session.submit(text, on_token=on_token, on_done=on_done)
+                except SessionBusy as e:
+                    await outbox.put({"type": "error", "error": str(e)})
+        finally:
+            sender_task.cancel()
+            await self.close_session(session.session_id)
+        return ws
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "ok": True,
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "pending_messages": sum(s.queue.qsize() for s in self.sessions.values()),
+            "tool_cache": ollama_integration.tool_cache.stats(),
+            "router": ollama_integration.router_stats()
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.prometheus_text(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def handle_metrics_json(self, request: web.Request) -> web.Response:
+        return web.json_response({"enabled": metrics.enabled(), "calls": metrics.snapshot(), "gauges": metrics.gauges()})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SenioCare multi-session chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--queue-size", type=int, default=SESSION_QUEUE_SIZE)
+    parser.add_argument("--tool-workers", type=int, default=TOOL_WORKERS)
+    parser.add_argument("--history-tokens", type=int, default=HISTORY_TOKENS)
+    parser.add_argument("--llm-concurrency", type=int, default=ollama_integration.LLM_MAX_IN_FLIGHT)
+    parser.add_argument("--data-watch-interval", type=float, default=DATA_WATCH_INTERVAL)
+    parser.add_argument("--ollama-url", default=ollama_integration.OLLAMA_URL)
+    args = parser.parse_args()
+
+    ollama_integration.OLLAMA_URL = args.ollama_url
+    ollama_integration.scheduler.max_in_flight = max(1, args.llm_concurrency)
+
+    server = ChatServer(
+        max_sessions=args.max_sessions,
+        queue_size=args.queue_size,
+        history_tokens=args.history_tokens,
+        tool_workers=args.tool_workers,
+        data_watch_interval=args.data_watch_interval
+    )
+    web.run_app(server.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
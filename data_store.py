@@ -0,0 +1,628 @@
+import json
+import os
+import re
+import threading
+import time
+from bisect import insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from food_search import FoodSearchIndex
+from nutrient_table import NutrientTable, as_row_array
+
+
+INCREMENTAL_MAX_CHANGED = 0.1 # a reload patches the food indexes up to this fraction of changed rows, else rebuilds them
+
+
+def normalize_text(s: Optional[str]) -> str:
+    return (s or "").strip().lower()
+
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("ches", "shes", "sses", "xes", "zes", "oes")):
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def singular_text(s: Optional[str]) -> str:
+    """
+    Normalized words (punctuation and hyphens split them) joined by single
+    spaces, each reduced to a rough singular ("peanuts" -> "peanut",
+    "whole-wheat" -> "whole wheat"); compare two strings only after both
+    went through it.
+    """
+    return " ".join(_singular(w) for w in re.findall(r"[^\W_]+", normalize_text(s)))
+
+
+def has_words(text: str, words: str) -> bool:
+    """True if words occurs in text as whole consecutive words (both already singular_text())."""
+    return bool(words) and f" {words} " in f" {text} "
+
+
+# ---------------------------
+# Storage backend interface (what the tools in functions.py read through)
+# ---------------------------
+
+class BaseIndex:
+    """
+    Read-only view of one version of the data. Implemented by DataIndex
+    (JSON file, fully in memory) and sqlite_store.SqliteIndex (rows are
+    queried on demand). Records are returned as the original JSON dicts.
+    """
+
+    version: int = 0
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """The whole document; only for debugging / export on large stores."""
+        raise NotImplementedError
+
+    def get_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def find_food(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def all_foods(self) -> Sequence[Dict[str, Any]]:
+        """Every food in file order (for whole-catalogue precomputation)."""
+        raise NotImplementedError
+
+    def food_columns(self) -> Tuple[List[str], List[str], Dict[str, List[int]], np.ndarray]:
+        """
+        The catalogue as columns for whole-catalogue precomputation: normalized
+        names and categories in row order, normalized tag -> ascending rows,
+        and the (n_foods, 6) nutrient matrix. Backends that can read these
+        without decoding every record override it.
+        """
+        foods = self.all_foods()
+        tags: Dict[str, List[int]] = {}
+        for row, f in enumerate(foods):
+            for tag in sorted({normalize_text(t) for t in f.get("tags", [])}):
+                tags.setdefault(tag, []).append(row)
+        return (
+            [normalize_text(f.get("food_name")) for f in foods],
+            [normalize_text(f.get("category")) for f in foods],
+            tags,
+            NutrientTable(foods).values
+        )
+
+    def food_names(self, rows: Sequence[int]) -> List[Optional[str]]:
+        """Original food_name of each row (rows as in food_columns())."""
+        foods = self.all_foods()
+        return [foods[r].get("food_name") for r in rows]
+
+    def foods_in_category(self, category: Optional[str]) -> Iterable[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_drug(self, drug_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def interactions_for_food(self, food_name: Optional[str]) -> List[Tuple[str, str]]:
+        """[(drug_name, notes)] for drugs whose avoid_foods contain the food."""
+        raise NotImplementedError
+
+    def meal_plan_for_condition(self, condition: Optional[str]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def search_foods(self, query: str, category: Optional[str], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+        """Ranked food search; query/category are already normalized."""
+        raise NotImplementedError
+
+    def food_nutrients(self, names: List[Optional[str]]) -> Tuple[List[Optional[Dict[str, Any]]], np.ndarray]:
+        """
+        Resolve names to foods (None if unknown) plus a (n_found, 6) nutrient
+        matrix (nutrient_table.NUTRIENT_COLUMNS) for the found ones, in order.
+        """
+        raise NotImplementedError
+
+
+# ---------------------------
+# Record-level diff between two versions of the data file
+# ---------------------------
+
+def _user_id(u: Dict[str, Any]) -> Any:
+    return u.get("user_id")
+
+
+def _drug_key(d: Dict[str, Any]) -> str:
+    return normalize_text(d.get("drug_name"))
+
+
+def _plan_key(p: Dict[str, Any]) -> str:
+    return normalize_text(p.get("condition"))
+
+
+def _changed_keys(old: List[Dict[str, Any]], new: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Any]) -> Set[Any]:
+    if old == new:
+        return set()
+    # grouped so that duplicates (which still feed inverted indexes) are compared too
+    before: Dict[Any, List[Dict[str, Any]]] = {}
+    after: Dict[Any, List[Dict[str, Any]]] = {}
+    for r in old:
+        before.setdefault(key(r), []).append(r)
+    for r in new:
+        after.setdefault(key(r), []).append(r)
+    return {k for k in before.keys() | after.keys() if before.get(k) != after.get(k)}
+
+
+class DataDiff:
+    """
+    What changed between two versions of the data file. Foods are compared
+    by position (food_rows are rows of the new list that changed or were
+    appended); users, drugs and meal plans by key (user_id, normalized
+    drug_name, normalized condition). affected_users are the changed users
+    plus every user (before or after) taking a changed drug.
+    """
+
+    def __init__(self, old: Dict[str, Any], new: Dict[str, Any]):
+        old_foods, new_foods = old.get("foods", []), new.get("foods", [])
+        self.food_rows: List[int] = []
+        self.foods_removed = max(0, len(old_foods) - len(new_foods))
+        if old_foods != new_foods:
+            self.food_rows = [row for row, (a, b) in enumerate(zip(old_foods, new_foods)) if a != b]
+            self.food_rows.extend(range(len(old_foods), len(new_foods)))
+
+        self.users: Set[Any] = _changed_keys(old.get("users", []), new.get("users", []), _user_id)
+        self.drugs: Set[str] = _changed_keys(old.get("drugs", []), new.get("drugs", []), _drug_key)
+        self.meal_plans: Set[str] = _changed_keys(old.get("meal_plans", []), new.get("meal_plans", []), _plan_key)
+        collections = {"foods", "users", "drugs", "meal_plans"}
+        self.other: Set[str] = {
+            k for k in (old.keys() | new.keys()) - collections if old.get(k) != new.get(k)
+        }
+
+        self.affected_users: Set[Any] = set(self.users)
+        if self.drugs:
+            for u in old.get("users", []) + new.get("users", []):
+                if any(normalize_text(m) in self.drugs for m in u.get("medications", [])):
+                    self.affected_users.add(_user_id(u))
+
+    @property
+    def foods_changed(self) -> bool:
+        return bool(self.food_rows or self.foods_removed)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "food_rows": len(self.food_rows),
+            "foods_removed": self.foods_removed,
+            "users": len(self.users),
+            "drugs": sorted(self.drugs),
+            "meal_plans": sorted(self.meal_plans),
+            "affected_users": len(self.affected_users),
+            "other": sorted(self.other)
+        }
+
+
+# ---------------------------
+# Indexed, read-only view of one version of the data file
+# ---------------------------
+
+def _food_keys(f: Dict[str, Any]) -> Tuple[str, str, Set[str]]:
+    """Normalized (name, category, distinct tags) a food is indexed under."""
+    return (
+        normalize_text(f.get("food_name")),
+        normalize_text(f.get("category")),
+        {normalize_text(t) for t in f.get("tags", [])}
+    )
+
+
+class DataIndex(BaseIndex):
+    """
+    Hash indexes over a parsed mock_data.json document.
+    Built once per file version and never mutated afterwards, so it can be
+    shared freely between threads.
+    """
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        version: int = 0,
+        previous: Optional["DataIndex"] = None,
+        diff: Optional[DataDiff] = None
+    ):
+        """
+        With `previous` and the `diff` from its data, collections that did not
+        change share previous's lists and indexes, and the food indexes are
+        patched for the changed rows instead of rebuilt (unless rows were
+        removed or more than INCREMENTAL_MAX_CHANGED of them changed).
+        """
+        if previous is None or diff is None:
+            previous, diff = None, None
+        data = dict(data)
+        self.version = version
+
+        if diff is not None and not diff.users:
+            data["users"] = self.users = previous.users
+            self.users_by_id = previous.users_by_id
+        else:
+            self.users = data.get("users", [])
+            self.users_by_id: Dict[Any, Dict[str, Any]] = {}
+            for u in self.users:
+                self.users_by_id.setdefault(u.get("user_id"), u)
+
+        if diff is not None and not diff.foods_changed:
+            data["foods"] = self.foods = previous.foods
+            self.foods_by_name = previous.foods_by_name
+            self.food_row_by_name = previous.food_row_by_name
+            self.foods_by_category = previous.foods_by_category
+            self.foods_by_tag = previous.foods_by_tag
+            self._rows_by_name = previous._rows_by_name
+            self._rows_by_category = previous._rows_by_category
+            self._rows_by_tag = previous._rows_by_tag
+            self._search = previous._search
+            self._nutrients = previous._nutrients
+        elif diff is not None and not diff.foods_removed and (
+            len(diff.food_rows) <= INCREMENTAL_MAX_CHANGED * max(1, len(data.get("foods", [])))
+        ):
+            self._patch_foods(previous, diff, data.get("foods", []))
+            data["foods"] = self.foods
+        else:
+            self.foods = data.get("foods", [])
+            self._index_foods()
+            self._search: Optional[FoodSearchIndex] = None
+            self._nutrients: Optional[NutrientTable] = None
+
+        if diff is not None and not diff.drugs:
+            data["drugs"] = self.drugs = previous.drugs
+            self.drugs_by_name = previous.drugs_by_name
+            self.avoid_index = previous.avoid_index
+        else:
+            self.drugs = data.get("drugs", [])
+            self.drugs_by_name: Dict[str, Dict[str, Any]] = {}
+            # inverted drug index: normalized food -> [(drug_name, notes)] in file order
+            self.avoid_index: Dict[str, List[Tuple[str, str]]] = {}
+            for d in self.drugs:
+                self.drugs_by_name.setdefault(normalize_text(d.get("drug_name")), d)
+                entry = (d.get("drug_name"), d.get("notes", ""))
+                for food in {normalize_text(x) for x in d.get("avoid_foods", [])}:
+                    self.avoid_index.setdefault(food, []).append(entry)
+
+        if diff is not None and not diff.meal_plans:
+            data["meal_plans"] = self.meal_plans = previous.meal_plans
+            self.meal_plans_by_condition = previous.meal_plans_by_condition
+        else:
+            self.meal_plans = data.get("meal_plans", [])
+            self.meal_plans_by_condition: Dict[str, Dict[str, Any]] = {}
+            for p in self.meal_plans:
+                self.meal_plans_by_condition.setdefault(normalize_text(p.get("condition")), p)
+
+        self._data = data
+
+    def _index_foods(self) -> None:
+        self.foods_by_name: Dict[str, Dict[str, Any]] = {}
+        self.food_row_by_name: Dict[str, int] = {}
+        self.foods_by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self.foods_by_tag: Dict[str, List[Dict[str, Any]]] = {}
+        # ascending rows per key, so a reload can patch the indexes above
+        self._rows_by_name: Dict[str, List[int]] = {}
+        self._rows_by_category: Dict[str, List[int]] = {}
+        self._rows_by_tag: Dict[str, List[int]] = {}
+        for row, f in enumerate(self.foods):
+            name, category, tags = _food_keys(f)
+            self.foods_by_name.setdefault(name, f)
+            self.food_row_by_name.setdefault(name, row)
+            self._rows_by_name.setdefault(name, []).append(row)
+            self.foods_by_category.setdefault(category, []).append(f)
+            self._rows_by_category.setdefault(category, []).append(row)
+            for tag in tags:
+                self.foods_by_tag.setdefault(tag, []).append(f)
+                self._rows_by_tag.setdefault(tag, []).append(row)
+
+    def _patch_foods(self, previous: "DataIndex", diff: DataDiff, new_foods: List[Dict[str, Any]]) -> None:
+        # unchanged rows keep previous's records, so every index holds the same objects
+        changed = set(diff.food_rows)
+        old_count = len(previous.foods)
+        self.foods = [new_foods[r] if r in changed else previous.foods[r] for r in range(len(new_foods))]
+
+        self.foods_by_name = dict(previous.foods_by_name)
+        self.food_row_by_name = dict(previous.food_row_by_name)
+        self.foods_by_category = dict(previous.foods_by_category)
+        self.foods_by_tag = dict(previous.foods_by_tag)
+        self._rows_by_name = dict(previous._rows_by_name)
+        self._rows_by_category = dict(previous._rows_by_category)
+        self._rows_by_tag = dict(previous._rows_by_tag)
+
+        touched: Dict[int, Set[str]] = {
+            id(t): set() for t in (self._rows_by_name, self._rows_by_category, self._rows_by_tag)
+        }
+
+        def postings(table: Dict[str, List[int]], key: str) -> List[int]:
+            # copy-on-write: previous still shares the untouched lists
+            keys = touched[id(table)]
+            if key not in keys:
+                keys.add(key)
+                table[key] = list(table.get(key, []))
+            return table[key]
+
+        for row in diff.food_rows:
+            if row < old_count:
+                name, category, tags = _food_keys(previous.foods[row])
+                postings(self._rows_by_name, name).remove(row)
+                postings(self._rows_by_category, category).remove(row)
+                for tag in tags:
+                    postings(self._rows_by_tag, tag).remove(row)
+            name, category, tags = _food_keys(self.foods[row])
+            insort(postings(self._rows_by_name, name), row)
+            insort(postings(self._rows_by_category, category), row)
+            for tag in tags:
+                insort(postings(self._rows_by_tag, tag), row)
+
+        for name in touched[id(self._rows_by_name)]:
+            rows = self._rows_by_name[name]
+            if rows:
+                self.food_row_by_name[name] = rows[0]
+                self.foods_by_name[name] = self.foods[rows[0]]
+            else:
+                del self._rows_by_name[name], self.food_row_by_name[name], self.foods_by_name[name]
+        for rows_by, foods_by in (
+            (self._rows_by_category, self.foods_by_category), (self._rows_by_tag, self.foods_by_tag)
+        ):
+            for key in touched[id(rows_by)]:
+                rows = rows_by[key]
+                if rows:
+                    foods_by[key] = [self.foods[r] for r in rows]
+                else:
+                    del rows_by[key], foods_by[key]
+
+        # only derived indexes the previous version had already built; the rest stay lazy
+        self._nutrients: Optional[NutrientTable] = None
+        self._search: Optional[FoodSearchIndex] = None
+        if previous._nutrients is not None:
+            self._nutrients = previous._nutrients.updated(self.foods, diff.food_rows)
+        if previous._search is not None:
+            self._search = previous._search.updated([
+                (
+                    row,
+                    normalize_text(self.foods[row].get("food_name")),
+                    normalize_text(self.foods[row].get("category")),
+                    [normalize_text(t) for t in self.foods[row].get("tags", [])]
+                )
+                for row in diff.food_rows
+            ])
+
+    def search_index(self) -> FoodSearchIndex:
+        # built on first search; a racing duplicate build is harmless
+        if self._search is None:
+            self._search = FoodSearchIndex(
+                [normalize_text(f.get("food_name")) for f in self.foods],
+                [normalize_text(f.get("category")) for f in self.foods],
+                [[normalize_text(t) for t in f.get("tags", [])] for f in self.foods]
+            )
+        return self._search
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self._data
+
+    def search_foods(self, query: str, category: Optional[str], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+        rows = self.search_index().search(query, category=category, limit=limit, fuzzy=fuzzy)
+        return [self.foods[r] for r in rows]
+
+    def food_nutrients(self, names: List[Optional[str]]) -> Tuple[List[Optional[Dict[str, Any]]], np.ndarray]:
+        rows = self.food_rows(names)
+        foods = [self.foods[r] if r >= 0 else None for r in rows.tolist()]
+        return foods, self.nutrients().values[rows[rows >= 0]]
+
+    def nutrients(self) -> NutrientTable:
+        if self._nutrients is None:
+            self._nutrients = NutrientTable(self.foods)
+        return self._nutrients
+
+    def food_rows(self, names: List[Optional[str]]) -> np.ndarray:
+        """Row ids into self.foods / nutrients() for each name (-1 if unknown)."""
+        rows = self.food_row_by_name
+        return as_row_array([rows.get(normalize_text(n), -1) for n in names])
+
+    def get_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        return self.users_by_id.get(user_id)
+
+    def find_food(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.foods_by_name.get(normalize_text(name))
+
+    def all_foods(self) -> List[Dict[str, Any]]:
+        return self.foods
+
+    def food_columns(self) -> Tuple[List[str], List[str], Dict[str, List[int]], np.ndarray]:
+        return (
+            [normalize_text(f.get("food_name")) for f in self.foods],
+            [normalize_text(f.get("category")) for f in self.foods],
+            self._rows_by_tag,
+            self.nutrients().values
+        )
+
+    def foods_in_category(self, category: Optional[str]) -> List[Dict[str, Any]]:
+        return self.foods_by_category.get(normalize_text(category), [])
+
+    def foods_with_tag(self, tag: Optional[str]) -> List[Dict[str, Any]]:
+        return self.foods_by_tag.get(normalize_text(tag), [])
+
+    def get_drug(self, drug_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.drugs_by_name.get(normalize_text(drug_name))
+
+    def interactions_for_food(self, food_name: Optional[str]) -> List[Tuple[str, str]]:
+        return self.avoid_index.get(normalize_text(food_name), [])
+
+    def meal_plan_for_condition(self, condition: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.meal_plans_by_condition.get(normalize_text(condition))
+
+
+# ---------------------------
+# Loaded-once store with change detection
+# ---------------------------
+
+# fn(path, old_index, new_index, diff) after every reload of a DataStore that had
+# a previous version; called before the new index is published
+ReloadListener = Callable[[str, "DataIndex", "DataIndex", DataDiff], None]
+_reload_listeners: List[ReloadListener] = []
+
+
+def add_reload_listener(fn: ReloadListener) -> None:
+    _reload_listeners.append(fn)
+
+
+def remove_reload_listener(fn: ReloadListener) -> None:
+    if fn in _reload_listeners:
+        _reload_listeners.remove(fn)
+
+
+class DataStore:
+    """
+    Parses the data file once and keeps a DataIndex for it.
+    Every access stats the file; the JSON is only re-parsed when its mtime
+    or size changed, and then only the changed collections / food rows are
+    re-indexed (see DataDiff). While one thread reloads, the others keep
+    getting the previous index instead of waiting. With watch() the reload
+    moves to a background thread and index() no longer stats the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # (signature, index) swapped as one reference so readers never mix versions
+        self._current: Optional[Tuple[Tuple[int, int], DataIndex]] = None
+        self._loads = 0
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.incremental_loads = 0
+        self.last_reload: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def _stat_signature(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload(self, sig: Tuple[int, int]) -> Tuple[Tuple[int, int], DataIndex]:
+        # caller holds self._lock
+        started = time.perf_counter()
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        previous = self._current[1] if self._current is not None else None
+        self._loads += 1
+        if previous is None:
+            current = (sig, DataIndex(data, version=self._loads))
+            self._current = current
+            return current
+
+        diff = DataDiff(previous.data, data)
+        current = (sig, DataIndex(data, version=self._loads, previous=previous, diff=diff))
+        self.incremental_loads += 1
+        try:
+            for fn in list(_reload_listeners):
+                fn(self.path, previous, current[1], diff)
+        finally:
+            self._current = current
+            self.last_reload = {
+                "version": self._loads,
+                "seconds": round(time.perf_counter() - started, 4),
+                "diff": diff.summary()
+            }
+        return current
+
+    def index(self) -> DataIndex:
+        current = self._current
+        if current is not None and self._watcher is not None:
+            return current[1]
+        sig = self._stat_signature()
+        if current is not None and current[0] == sig:
+            return current[1]
+        if not self._lock.acquire(blocking=current is None):
+            # another thread is reloading; answer from the previous version meanwhile
+            return current[1]
+        try:
+            # another thread may have reloaded while we waited
+            current = self._current
+            if current is None or current[0] != sig:
+                current = self._reload(sig)
+            return current[1]
+        finally:
+            self._lock.release()
+
+    def watch(self, interval: float = 1.0) -> None:
+        """
+        Poll the file every `interval` seconds from a daemon thread and reload
+        there. A file that fails to parse (e.g. caught mid-write) is skipped:
+        the previous version stays current until the file changes again.
+        """
+        self.index()
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), name="data-watch", daemon=True
+            )
+            self._watcher.start()
+
+    def stop_watching(self) -> None:
+        watcher = self._watcher
+        if watcher is not None:
+            self._stop.set()
+            watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval: float) -> None:
+        failed = None
+        while not self._stop.wait(interval):
+            try:
+                sig = self._stat_signature()
+            except OSError:
+                # replaced non-atomically; try again next round
+                continue
+            current = self._current
+            if (current is not None and current[0] == sig) or sig == failed:
+                continue
+            try:
+                with self._lock:
+                    self._reload(sig)
+                failed = None
+                self.last_error = None
+            except Exception as e:
+                # keep the thread alive whatever went wrong (bad JSON, a failing listener)
+                failed = sig
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self._loads,
+            "incremental_loads": self.incremental_loads,
+            "watching": self._watcher is not None,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error
+        }
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._current = None
+
+
+_stores: Dict[str, DataStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str):
+    """
+    Return the shared store for `path` (one per absolute path): a DataStore
+    for JSON files, a sqlite_store.SqliteStore for .db/.sqlite/.sqlite3 and
+    a snapshot_store.SnapshotStore for .snap.
+    """
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        # these import this module, so they can't be imported at the top
+        import snapshot_store
+        import sqlite_store
+
+        if key.lower().endswith(sqlite_store.SQLITE_EXTENSIONS):
+            backend = sqlite_store.SqliteStore
+        elif key.lower().endswith(snapshot_store.SNAPSHOT_EXTENSIONS):
+            backend = snapshot_store.SnapshotStore
+        else:
+            backend = DataStore
+        with _stores_lock:
+            store = _stores.setdefault(key, backend(key))
+    return store
@@ -0,0 +1,330 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# ---------------------------
+# Food search index (prefix + trigram + bounded fuzzy)
+# ---------------------------
+# Works on already-normalized strings; rows are positions in the foods list.
+
+FUZZY_MAX_CANDIDATES = 64 # names checked by edit distance per fuzzy query (most trigram overlap first)
+
+
+def trigrams(s: str) -> List[str]:
+    return [s[i:i + 3] for i in range(len(s) - 2)]
+
+
+def short_grams(s: str) -> Set[str]:
+    """Distinct 1- and 2-character substrings: postings for queries too short for trigrams."""
+    return set(s) | {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+def _pair_bounds(keys: List[str], key: str) -> Tuple[int, int]:
+    return bisect_left(keys, key), bisect_right(keys, key)
+
+
+def _pair_remove(keys: List[str], rows: List[int], key: str, row: int) -> None:
+    # parallel lists sorted by (key, row): rows are ascending within a key's run
+    lo, hi = _pair_bounds(keys, key)
+    i = bisect_left(rows, row, lo, hi)
+    if i < hi and rows[i] == row:
+        del keys[i]
+        del rows[i]
+
+
+def _pair_insert(keys: List[str], rows: List[int], key: str, row: int) -> None:
+    lo, hi = _pair_bounds(keys, key)
+    i = bisect_left(rows, row, lo, hi)
+    keys.insert(i, key)
+    rows.insert(i, row)
+
+
+def default_max_edits(query: str) -> int:
+    if len(query) < 4:
+        return 0
+    if len(query) < 8:
+        return 1
+    return 2
+
+
+def prefix_edit_distance(query: str, text: str, max_dist: int) -> Optional[int]:
+    """Smallest Levenshtein distance between query and any prefix of text, or None if above max_dist."""
+    text = text[:len(query) + max_dist]  # longer prefixes are too far by length alone
+    prev = list(range(len(text) + 1))
+    for i, ca in enumerate(query, 1):
+        cur = [i] + [0] * len(text)
+        row_min = i
+        for j, cb in enumerate(text, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < row_min:
+                row_min = cur[j]
+        if row_min > max_dist:
+            return None
+        prev = cur
+    best = min(prev)
+    return best if best <= max_dist else None
+
+
+def fuzzy_match(query: str, name: str, max_edits: int) -> bool:
+    """
+    True if a prefix of name, or of name from one of its words on, is within
+    max_edits of query ("chiken" -> "chicken breast", "brocoli" -> "steamed broccoli").
+    """
+    if prefix_edit_distance(query, name, max_edits) is not None:
+        return True
+    start = name.find(" ")
+    while start != -1:
+        if prefix_edit_distance(query, name[start + 1:], max_edits) is not None:
+            return True
+        start = name.find(" ", start + 1)
+    return False
+
+
+def fuzzy_rows(
+    q: str,
+    max_edits: int,
+    gram_counts: Callable[[List[str]], Dict[str, int]],
+    postings: Callable[[str], Iterable[int]],
+    names_of: Callable[[List[int]], List[str]],
+    max_candidates: int = FUZZY_MAX_CANDIDATES
+) -> Iterator[Tuple[int, str]]:
+    """
+    (row, name) of the fuzzy matches of q, most shared trigrams first (ties
+    by row). Storage-agnostic so every backend ranks the same way:
+    gram_counts(grams) -> posting sizes, postings(gram) -> rows,
+    names_of(rows) -> names. At most max_candidates names are checked.
+    """
+    if max_edits <= 0 or len(q) < 3:
+        return
+    q_grams = sorted(set(trigrams(q)))
+    counts = gram_counts(q_grams)
+    # each edit destroys at most 3 trigrams, so a match shares at least
+    # one of any 3*max_edits+1 of them: only the rarest postings are read
+    read = sorted((g for g in q_grams if counts.get(g)), key=lambda g: (counts[g], g))[:3 * max_edits + 1]
+    overlap: Counter = Counter()
+    for g in read:
+        overlap.update(postings(g))
+    # a match shares at least min_shared trigrams, of which at most
+    # `unread` can come from postings that were not read
+    min_shared = max(1, len(q_grams) - 3 * max_edits)
+    unread = len(q_grams) - len(read)
+    ranked = heapq.nsmallest(
+        max_candidates,
+        ((-n, row) for row, n in overlap.items() if n + unread >= min_shared)
+    )
+    rows = [row for _, row in ranked]
+    q_set = set(q_grams)
+    # distance is only computed lazily, so the caller's `limit` bounds the
+    # edit-distance work too
+    for row, name in zip(rows, names_of(rows)):
+        if len(q_set.intersection(trigrams(name))) >= min_shared and fuzzy_match(q, name, max_edits):
+            yield row, name
+
+
+class FoodSearchIndex:
+    """
+    Ranked search over food names and tags.
+    Match tiers (best first): exact name, name prefix, word prefix,
+    substring, tag prefix. Results are produced lazily tier by tier so a
+    query stops as soon as `limit` rows have been collected. Only when
+    those tiers find nothing, in any category, does the fuzzy tier
+    (bounded edit distance) run, to catch typos.
+    """
+
+    def __init__(self, names: Sequence[str], categories: Sequence[str], tags: Sequence[Sequence[str]]):
+        self.names = list(names)
+        self.categories = list(categories)
+        self.tags = [list(t) for t in tags]
+
+        self.exact: Dict[str, List[int]] = {}
+        words: List[Tuple[str, int]] = []
+        tag_pairs: List[Tuple[str, int]] = []
+        self.grams: Dict[str, List[int]] = {}
+        self.short: Dict[str, List[int]] = {}
+        for row, name in enumerate(self.names):
+            self.exact.setdefault(name, []).append(row)
+            for w in set(name.split()):
+                words.append((w, row))
+            for t in set(tags[row]):
+                tag_pairs.append((t, row))
+            for g in set(trigrams(name)):
+                self.grams.setdefault(g, []).append(row)
+            for g in short_grams(name):
+                self.short.setdefault(g, []).append(row)
+
+        name_pairs = sorted((n, r) for r, n in enumerate(self.names))
+        self._name_keys = [n for n, _ in name_pairs]
+        self._name_rows = [r for _, r in name_pairs]
+        words.sort()
+        self._word_keys = [w for w, _ in words]
+        self._word_rows = [r for _, r in words]
+        tag_pairs.sort()
+        self._tag_keys = [t for t, _ in tag_pairs]
+        self._tag_rows = [r for _, r in tag_pairs]
+
+    def updated(self, changes: Sequence[Tuple[int, str, str, Sequence[str]]]) -> "FoodSearchIndex":
+        """
+        Copy of the index with rows replaced or appended: changes are
+        (row, name, category, tags) with row <= len(names), applied in order.
+        Only the entries of the changed rows are touched (posting lists are
+        copied before they are edited), so the result equals a full rebuild
+        and this index stays valid for readers still using it.
+        """
+        new = FoodSearchIndex.__new__(FoodSearchIndex)
+        new.names = list(self.names)
+        new.categories = list(self.categories)
+        new.tags = list(self.tags)
+        new.exact = dict(self.exact)
+        new.grams = dict(self.grams)
+        new.short = dict(self.short)
+        new._name_keys, new._name_rows = list(self._name_keys), list(self._name_rows)
+        new._word_keys, new._word_rows = list(self._word_keys), list(self._word_rows)
+        new._tag_keys, new._tag_rows = list(self._tag_keys), list(self._tag_rows)
+
+        copied = set()
+
+        def postings(table: Dict[str, List[int]], key: str) -> List[int]:
+            # copy-on-write: the old index still shares the untouched lists
+            if (id(table), key) not in copied:
+                copied.add((id(table), key))
+                table[key] = list(table.get(key, []))
+            return table[key]
+
+        def drop(table: Dict[str, List[int]], key: str, row: int) -> None:
+            rows = postings(table, key)
+            rows.remove(row)
+            if not rows:
+                del table[key]
+                copied.discard((id(table), key))
+
+        for row, name, category, tags in changes:
+            if row < len(new.names):
+                old = new.names[row]
+                drop(new.exact, old, row)
+                for w in set(old.split()):
+                    _pair_remove(new._word_keys, new._word_rows, w, row)
+                for t in set(new.tags[row]):
+                    _pair_remove(new._tag_keys, new._tag_rows, t, row)
+                for g in set(trigrams(old)):
+                    drop(new.grams, g, row)
+                for g in short_grams(old):
+                    drop(new.short, g, row)
+                _pair_remove(new._name_keys, new._name_rows, old, row)
+                new.names[row], new.categories[row], new.tags[row] = name, category, list(tags)
+            else:
+                new.names.append(name)
+                new.categories.append(category)
+                new.tags.append(list(tags))
+
+            insort(postings(new.exact, name), row)
+            for w in set(name.split()):
+                _pair_insert(new._word_keys, new._word_rows, w, row)
+            for t in set(tags):
+                _pair_insert(new._tag_keys, new._tag_rows, t, row)
+            for g in set(trigrams(name)):
+                insort(postings(new.grams, g), row)
+            for g in short_grams(name):
+                insort(postings(new.short, g), row)
+            _pair_insert(new._name_keys, new._name_rows, name, row)
+        return new
+
+    # ---- lookups (overridden by snapshot_store's memory-mapped index) ----
+
+    @staticmethod
+    def _prefix_rows(keys: List[str], rows: List[int], prefix: str) -> Iterator[int]:
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield rows[i]
+            i += 1
+
+    def _exact_rows(self, q: str) -> Iterator[int]:
+        return iter(self.exact.get(q, []))
+
+    def _name_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._prefix_rows(self._name_keys, self._name_rows, q)
+
+    def _word_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._prefix_rows(self._word_keys, self._word_rows, q)
+
+    def _tag_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._prefix_rows(self._tag_keys, self._tag_rows, q)
+
+    def _gram_count(self, gram: str) -> int:
+        return len(self.grams.get(gram, ()))
+
+    def _gram_rows(self, gram: str) -> Iterable[int]:
+        return self.grams.get(gram, [])
+
+    def _short_rows(self, q: str) -> Iterator[int]:
+        return iter(self.short.get(q, []))
+
+    # ---- tiers ----
+
+    def _substring_rows(self, q: str) -> Iterator[int]:
+        if len(q) < 3:
+            # too short for trigrams: the 1-2 character postings are exactly the matches
+            yield from self._short_rows(q)
+            return
+        grams = set(trigrams(q))
+        counts = {g: self._gram_count(g) for g in grams}
+        if not all(counts.values()):
+            return
+        # every match is in the rarest trigram's posting list
+        for row in self._gram_rows(min(grams, key=lambda g: (counts[g], g))):
+            if q in self.names[row]:
+                yield row
+
+    def _fuzzy_rows(self, q: str, max_edits: int) -> Iterator[int]:
+        for row, _ in fuzzy_rows(
+            q, max_edits,
+            lambda grams: {g: self._gram_count(g) for g in grams},
+            self._gram_rows,
+            lambda rows: [self.names[r] for r in rows]
+        ):
+            yield row
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 10,
+        fuzzy: bool = True,
+        max_edits: Optional[int] = None
+    ) -> List[int]:
+        """Return up to `limit` row ids for an already-normalized query/category."""
+        if limit <= 0:
+            return []
+
+        if not query:
+            tiers = [iter(range(len(self.names)))]
+        else:
+            tiers = [
+                self._exact_rows(query),
+                self._name_prefix_rows(query),
+                self._word_prefix_rows(query),
+                self._substring_rows(query),
+                self._tag_prefix_rows(query),
+            ]
+
+        seen = set()
+        out: List[int] = []
+        matched = False  # before the category filter: a correct spelling is never retried as a typo
+        for tier in tiers:
+            for row in tier:
+                matched = True
+                if row in seen or (category is not None and self.categories[row] != category):
+                    continue
+                seen.add(row)
+                out.append(row)
+                if len(out) >= limit:
+                    return out
+
+        if not matched and query and fuzzy:
+            edits = default_max_edits(query) if max_edits is None else max_edits
+            for row in self._fuzzy_rows(query, edits):
+                if category is None or self.categories[row] == category:
+                    out.append(row)
+                    if len(out) >= limit:
+                        break
+        return out
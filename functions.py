@@ -1,21 +1,155 @@
+import heapq
 import json
-from typing import Any, Dict, List, Optional
+import os
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from data_store import BaseIndex, DataDiff, DataStore, add_reload_listener, get_store, normalize_text
+from health_context import HealthContext, HealthContextCache
+from ingredient_matcher import IngredientMatcher
+from meal_planner import MealPlanner
+from nutrient_table import COL
+from preference_log import PREF_FILE, PreferenceLog
 
 DATA_FILE = "mock_data.json"
+PREF_BATCH_SIZE = 1 # >1 buffers preference writes; records are flushed in groups
+PREF_FSYNC = False # True: fsync every preference write (durable, slower)
+INGREDIENT_CONCERNS_FILE = None # JSON concern dictionary (see ingredient_matcher.py); None = built-in terms
+
+_pref_log = PreferenceLog(PREF_FILE, batch_size=PREF_BATCH_SIZE, fsync=PREF_FSYNC)
+
+
+def _index() -> BaseIndex:
+    # parsed once, re-parsed only when mock_data.json changes on disk
+    return get_store(DATA_FILE).index()
+
+
+def data_version() -> int:
+    """Increases every time mock_data.json is (re)loaded; used to invalidate caches."""
+    return _index().version
+
+
+def watch_data_file(interval: float = 1.0) -> None:
+    """
+    Reload DATA_FILE from a background thread (JSON files only), so a
+    request never waits for a reload; see data_store.DataStore.watch.
+    """
+    store = get_store(DATA_FILE)
+    if isinstance(store, DataStore):
+        store.watch(interval)
+
+
+def on_data_reload(fn: Callable[[BaseIndex, BaseIndex, DataDiff], None]) -> None:
+    """Call fn(old_index, new_index, diff) on every incremental reload of DATA_FILE."""
+    def listener(path: str, old: BaseIndex, new: BaseIndex, diff: DataDiff) -> None:
+        if path == os.path.abspath(DATA_FILE):
+            fn(old, new, diff)
+    add_reload_listener(listener)
+
+
+# what each tool reads from the data file, for targeted cache invalidation:
+# "user" stands for one "user:<id>" per user_id / user_ids argument (drug
+# edits reach interaction results through DataDiff.affected_users; "foods"
+# there is for the allergy check); tools not listed may read anything
+TOOL_DATA_DEPS: Dict[str, Tuple[str, ...]] = {
+    "get_user_profile": ("user",),
+    "search_foods": ("foods",),
+    "check_drug_food_interactions": ("user", "foods"),
+    "check_drug_food_interactions_batch": ("user", "foods"),
+    "check_food_interactions_for_users": ("user", "foods"),
+    "suggest_meal_plan_for_user": ("user", "meal_plans"),
+    "generate_meal_plan": ("user", "foods"),
+    "generate_meal_plans_batch": ("user", "foods"),
+    "analyze_product": ("foods",),
+    "analyze_products_batch": ("foods",),
+    "compare_products": ("foods",),
+    "suggest_alternatives": ("foods",),
+    "calculate_meal_impact": ("foods",),
+    "review_cart": ("foods",),
+    "check_ingredient_concerns": (),
+    "check_ingredient_concerns_batch": (),
+    "get_portion_guidance": (),
+}
+
+
+def _user_dep(user_id: Any) -> str:
+    return "user:" + json.dumps(user_id, sort_keys=True, default=str)
+
+
+def data_deps(tool_name: str, args: Dict[str, Any]) -> FrozenSet[str]:
+    """Dependency tags of a tool result (see TOOL_DATA_DEPS); {"*"} = everything."""
+    spec = TOOL_DATA_DEPS.get(tool_name)
+    if spec is None:
+        return frozenset({"*"})
+    deps = set()
+    for part in spec:
+        if part != "user":
+            deps.add(part)
+            continue
+        user_ids = args.get("user_ids") if "user_ids" in args else [args.get("user_id")]
+        if not isinstance(user_ids, list):
+            return frozenset({"*"})
+        deps.update(_user_dep(u) for u in user_ids)
+    return frozenset(deps)
+
+
+def stale_deps(diff: DataDiff) -> Set[str]:
+    """Dependency tags whose cached results a reload with this diff invalidates."""
+    stale = {_user_dep(u) for u in diff.affected_users}
+    if diff.foods_changed:
+        stale.add("foods")
+    if diff.meal_plans:
+        stale.add("meal_plans")
+    return stale
 
 
 def _load_data() -> Dict[str, Any]:
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _index().data
 
 
 def _normalize_text(s: str) -> str:
-    return (s or "").strip().lower()
+    return normalize_text(s)
+
+
+_ingredient_matcher: Optional[IngredientMatcher] = None
+_planner: Optional[MealPlanner] = None
+_contexts: Optional[HealthContextCache] = None
+
 
+def _concern_matcher() -> IngredientMatcher:
+    # compiled once from INGREDIENT_CONCERNS_FILE (or the built-in dictionary)
+    global _ingredient_matcher
+    if _ingredient_matcher is None:
+        if INGREDIENT_CONCERNS_FILE:
+            _ingredient_matcher = IngredientMatcher.from_file(INGREDIENT_CONCERNS_FILE)
+        else:
+            _ingredient_matcher = IngredientMatcher()
+    return _ingredient_matcher
 
-def _find_food_by_name(data: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
-    n = _normalize_text(name)
-    return next((f for f in data.get("foods", []) if _normalize_text(f.get("food_name", "")) == n), None)
+
+def _health_contexts() -> HealthContextCache:
+    # per-user contexts belong to one data version; a new cache after a full reload
+    global _contexts
+    idx = _index()
+    cache = _contexts
+    if cache is None or cache.index is not idx:
+        cache = _contexts = HealthContextCache(idx)
+    return cache
+
+
+def _user_context(user_id: Any) -> Optional[HealthContext]:
+    return _health_contexts().get(user_id)
+
+
+def _carry_over_contexts(old: BaseIndex, new: BaseIndex, diff: DataDiff) -> None:
+    global _contexts
+    cache = _contexts
+    if cache is not None and cache.index is old:
+        _contexts = cache.rebased(new, diff)
+
+
+on_data_reload(_carry_over_contexts)
 
 
 # ---------------------------
@@ -23,73 +157,150 @@ def _find_food_by_name(data: Dict[str, Any], name: str) -> Optional[Dict[str, An
 # ---------------------------
 
 def get_user_profile(user_id: int) -> Dict[str, Any]:
-    data = _load_data()
-    for u in data.get("users", []):
-        if u.get("user_id") == user_id:
-            return {"found": True, "user": u}
+    ctx = _user_context(user_id)
+    if ctx:
+        return {"found": True, "user": ctx.user}
     return {"found": False, "error": f"user_id {user_id} not found"}
 
 
-def search_foods(query: str, category: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
-    data = _load_data()
+def search_foods(query: str, category: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> Dict[str, Any]:
+    """
+    search_foods(query, category?, limit?, fuzzy?)
+    Ranked: exact name > name prefix > word prefix > substring > tag prefix;
+    typo matches (fuzzy) only when none of those match, in any category.
+    Stops as soon as `limit` results are found, so `count` is the number returned.
+    """
+    idx = _index()
     q = _normalize_text(query)
     cat = _normalize_text(category) if category else None
 
-    results = []
-    for food in data.get("foods", []):
-        name = _normalize_text(food.get("food_name", ""))
-        fcat = _normalize_text(food.get("category", ""))
-        if q in name and (cat is None or cat == fcat):
-            results.append(food)
+    results = idx.search_foods(q, cat, limit, fuzzy)
+
+    return {"query": query, "category": category, "count": len(results), "results": results}
 
-    return {"query": query, "category": category, "count": len(results), "results": results[:limit]}
+
+def _match_interactions(pairs: List[Any], food_name: str) -> List[Dict[str, Any]]:
+    return [{"drug": drug, "food": food_name, "risk": "avoid", "notes": notes} for drug, notes in pairs]
 
 
 def check_drug_food_interactions(user_id: int, food_name: str) -> Dict[str, Any]:
-    data = _load_data()
-    user = next((u for u in data.get("users", []) if u.get("user_id") == user_id), None)
-    if not user:
+    """
+    check_drug_food_interactions(user_id, food_name)
+    The user's drugs that list the food, and their allergies it matches.
+    has_interaction covers the drugs only; read has_concern for "drugs or allergies".
+    """
+    contexts = _health_contexts()
+    ctx = contexts.get(user_id)
+    if not ctx:
         return {"ok": False, "error": f"user_id {user_id} not found"}
 
-    meds = [m for m in user.get("medications", [])]
-    food_n = _normalize_text(food_name)
-
-    matched = []
-    for drug in data.get("drugs", []):
-        if drug.get("drug_name") in meds:
-            avoid = drug.get("avoid_foods", [])
-            avoid_norm = [_normalize_text(x) for x in avoid]
-            if food_n in avoid_norm:
-                matched.append({
-                    "drug": drug.get("drug_name"),
-                    "food": food_name,
-                    "risk": "avoid",
-                    "notes": drug.get("notes", "")
-                })
+    pairs, allergens = ctx.check(contexts.index, food_name)
+    matched = _match_interactions(pairs, food_name)
 
     return {
         "ok": True,
         "user_id": user_id,
-        "medications": meds,
+        "medications": ctx.medications,
         "food": food_name,
         "interactions": matched,
-        "has_interaction": len(matched) > 0
+        "has_interaction": len(matched) > 0,
+        "allergens": allergens,
+        "has_concern": bool(matched or allergens)
     }
 
 
-def suggest_meal_plan_for_user(user_id: int) -> Dict[str, Any]:
-    data = _load_data()
-    user = next((u for u in data.get("users", []) if u.get("user_id") == user_id), None)
-    if not user:
+def check_drug_food_interactions_batch(user_id: int, food_names: List[str]) -> Dict[str, Any]:
+    """
+    check_drug_food_interactions_batch(user_id, food_names)
+    Screen many foods (a cart, a meal plan) against one user's medications and allergies.
+    has_interaction covers the drugs only; read has_concern for "drugs or allergies".
+    """
+    contexts = _health_contexts()
+    ctx = contexts.get(user_id)
+    if not ctx:
         return {"ok": False, "error": f"user_id {user_id} not found"}
 
-    diseases = user.get("chronic_diseases", [])
-    plans = data.get("meal_plans", [])
+    results = []
+    flagged = []
+    allergen_foods = []
+    for food_name in food_names:
+        pairs, allergens = ctx.check(contexts.index, food_name)
+        matched = _match_interactions(pairs, food_name)
+        if matched:
+            flagged.append(food_name)
+        if allergens:
+            allergen_foods.append(food_name)
+        results.append({
+            "food": food_name,
+            "interactions": matched,
+            "has_interaction": len(matched) > 0,
+            "allergens": allergens,
+            "has_concern": bool(matched or allergens)
+        })
+
+    return {
+        "ok": True,
+        "user_id": user_id,
+        "medications": ctx.medications,
+        "foods_checked": len(food_names),
+        "results": results,
+        "flagged_foods": flagged,
+        "has_interaction": len(flagged) > 0,
+        "allergen_foods": allergen_foods,
+        "has_concern": bool(flagged or allergen_foods)
+    }
+
+
+def check_food_interactions_for_users(food_name: str, user_ids: List[int]) -> Dict[str, Any]:
+    """
+    check_food_interactions_for_users(food_name, user_ids)
+    Screen one food against many users' medications and allergies.
+    has_interaction covers the drugs only; read has_concern for "drugs or allergies".
+    """
+    contexts = _health_contexts()
+
+    results = []
+    flagged = []
+    allergic = []
+    missing = []
+    for user_id in user_ids:
+        ctx = contexts.get(user_id)
+        if not ctx:
+            missing.append(user_id)
+            continue
+        pairs, allergens = ctx.check(contexts.index, food_name)
+        matched = _match_interactions(pairs, food_name)
+        if matched:
+            flagged.append(user_id)
+        if allergens:
+            allergic.append(user_id)
+        results.append({
+            "user_id": user_id,
+            "medications": ctx.medications,
+            "interactions": matched,
+            "has_interaction": len(matched) > 0,
+            "allergens": allergens,
+            "has_concern": bool(matched or allergens)
+        })
+
+    return {
+        "ok": True,
+        "food": food_name,
+        "users_checked": len(results),
+        "results": results,
+        "flagged_users": flagged,
+        "allergic_users": allergic,
+        "missing_users": missing
+    }
+
+
+def suggest_meal_plan_for_user(user_id: int) -> Dict[str, Any]:
+    ctx = _user_context(user_id)
+    if not ctx:
+        return {"ok": False, "error": f"user_id {user_id} not found"}
 
-    for d in diseases:
-        plan = next((p for p in plans if _normalize_text(p.get("condition")) == _normalize_text(d)), None)
-        if plan:
-            return {"ok": True, "user_id": user_id, "matched_condition": d, "meal_plan": plan}
+    if ctx.meal_plan:
+        return {"ok": True, "user_id": user_id, "matched_condition": ctx.matched_condition, "meal_plan": ctx.meal_plan}
 
     return {
         "ok": True,
@@ -100,6 +311,74 @@ def suggest_meal_plan_for_user(user_id: int) -> Dict[str, Any]:
     }
 
 
+MAX_PLAN_DAYS = 28
+
+
+def _meal_planner() -> MealPlanner:
+    # precomputed masks belong to one data version; rebuilt after a reload
+    global _planner
+    idx = _index()
+    planner = _planner
+    if planner is None or planner.index is not idx:
+        planner = _planner = MealPlanner(idx)
+    return planner
+
+
+def _carry_over_planner(old: BaseIndex, new: BaseIndex, diff: DataDiff) -> None:
+    # same foods: keep the masks and every cached plan not involving an edited drug
+    global _planner
+    planner = _planner
+    if planner is not None and planner.index is old and not diff.foods_changed:
+        _planner = planner.rebased(new, diff.drugs)
+
+
+on_data_reload(_carry_over_planner)
+
+
+def _user_plan(planner: MealPlanner, user: Dict[str, Any], days: int) -> Dict[str, Any]:
+    return planner.plan(
+        user.get("chronic_diseases", []), user.get("medications", []), user.get("allergies", []),
+        max(1, min(int(days), MAX_PLAN_DAYS))
+    )
+
+
+def generate_meal_plan(user_id: int, days: int = 7) -> Dict[str, Any]:
+    """
+    generate_meal_plan(user_id, days?)
+    Day-by-day plan built from the foods catalogue that respects all of the
+    user's conditions, their drugs' avoid lists and their allergies.
+    """
+    planner = _meal_planner()
+    user = planner.index.get_user(user_id)
+    if not user:
+        return {"ok": False, "error": f"user_id {user_id} not found"}
+    return {"ok": True, "user_id": user_id, **_user_plan(planner, user, days)}
+
+
+def generate_meal_plans_batch(user_ids: List[int], days: int = 7) -> Dict[str, Any]:
+    """
+    generate_meal_plans_batch(user_ids, days?)
+    generate_meal_plan for many users; users with the same conditions,
+    medications and allergies share one cached plan.
+    """
+    planner = _meal_planner()
+    results = []
+    missing = []
+    for user_id in user_ids:
+        user = planner.index.get_user(user_id)
+        if not user:
+            missing.append(user_id)
+            continue
+        results.append({"user_id": user_id, **_user_plan(planner, user, days)})
+
+    return {
+        "ok": True,
+        "users_planned": len(results),
+        "results": results,
+        "missing_users": missing
+    }
+
+
 # ---------------------------
 # NutriGuide tools (from PDF)
 # Names match the PDF so the model can call them
@@ -115,10 +394,8 @@ def analyze_product(
     - If nutrition_info provided => analyze directly
     - Else => try lookup by product_name in mock foods
     """
-    data = _load_data()
-
     if nutrition_info is None:
-        food = _find_food_by_name(data, product_name)
+        food = _index().find_food(product_name)
         if not food:
             return {"ok": False, "error": "No nutrition_info provided and product not found in mock foods"}
         nutrition_info = {
@@ -175,14 +452,108 @@ def analyze_product(
     }
 
 
-def compare_products(products: List[Dict[str, Any]], comparison_focus: str = "glycemic_impact") -> Dict[str, Any]:
+_BATCH_NUTRIENTS = ("total_carbs", "dietary_fiber", "added_sugars", "sugars", "sodium")
+
+# (recommendation, reason) per rule index used by analyze_products_batch
+_PRODUCT_VERDICTS = [
+    ("AVOID", "High sugar"),
+    ("CAUTION", "High net carbs"),
+    ("CAUTION", "High sodium"),
+    ("RECOMMENDED", "Good fiber with moderate carbs"),
+    ("ACCEPTABLE", "Moderate impact"),
+]
+
+
+def _nutrient_columns(
+    nutrition_infos: Union[List[Dict[str, Any]], Dict[str, Sequence[float]]]
+) -> Dict[str, np.ndarray]:
+    # None / NaN count as 0, like `float(x or 0)` in analyze_product
+    if isinstance(nutrition_infos, dict):
+        # column lengths are checked to be equal by the caller
+        n = max((len(v) for k, v in nutrition_infos.items() if k in _BATCH_NUTRIENTS and v is not None), default=0)
+        cols = {}
+        for key in _BATCH_NUTRIENTS:
+            col = nutrition_infos.get(key)
+            if col is None:
+                cols[key] = np.zeros(n, dtype=np.float64)
+            else:
+                cols[key] = np.nan_to_num(np.asarray(col, dtype=np.float64), nan=0.0)
+                if cols[key].ndim != 1:
+                    raise ValueError(f"{key} must be a flat list of numbers")
+        return cols
+    return {
+        key: np.nan_to_num(
+            np.array([float(info.get(key, 0) or 0) for info in nutrition_infos], dtype=np.float64), nan=0.0
+        )
+        for key in _BATCH_NUTRIENTS
+    }
+
+
+def analyze_products_batch(
+    nutrition_infos: Union[List[Dict[str, Any]], Dict[str, Sequence[float]]],
+    product_names: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    analyze_products_batch(nutrition_infos, product_names?)
+    Vectorized analyze_product for whole catalogues. nutrition_infos is either a
+    list of nutrition_info dicts or a dict of per-nutrient arrays
+    (total_carbs, dietary_fiber, added_sugars, sugars, sodium).
+    Recommendations/reasons/net_carbs match analyze_product item for item.
+    """
+    if isinstance(nutrition_infos, dict):
+        lengths = {}
+        for key in _BATCH_NUTRIENTS:
+            col = nutrition_infos.get(key)
+            if col is None:
+                continue
+            if isinstance(col, (str, bytes, dict)) or not hasattr(col, "__len__"):
+                return {"ok": False, "error": f"{key} must be a list of numbers, got {type(col).__name__}"}
+            lengths[key] = len(col)
+        if len(set(lengths.values())) > 1:
+            return {"ok": False, "error": f"nutrient columns differ in length: {lengths}"}
+    elif not isinstance(nutrition_infos, list) or not all(isinstance(x, dict) for x in nutrition_infos):
+        return {"ok": False, "error": "nutrition_infos must be a list of dicts or a dict of equal-length lists"}
+    try:
+        cols = _nutrient_columns(nutrition_infos)
+    except (TypeError, ValueError) as e:
+        return {"ok": False, "error": f"invalid nutrient values: {e}"}
+    total_carbs = cols["total_carbs"]
+    fiber = cols["dietary_fiber"]
+
+    net_carbs = np.maximum(0.0, total_carbs - fiber)
+
+    # same priority order as the if/elif chain in analyze_product
+    conditions = [
+        (cols["added_sugars"] > 10) | (cols["sugars"] > 20),
+        net_carbs > 35,
+        cols["sodium"] > 400,
+        (fiber >= 3) & (net_carbs < 25),
+    ]
+    rules = np.select(conditions, [0, 1, 2, 3], default=4).tolist()
+
+    return {
+        "ok": True,
+        "count": len(rules),
+        "product_names": product_names,
+        "recommendations": [_PRODUCT_VERDICTS[r][0] for r in rules],
+        "reasons": [_PRODUCT_VERDICTS[r][1] for r in rules],
+        "net_carbs": [round(x, 1) for x in net_carbs.tolist()]
+    }
+
+
+def compare_products(
+    products: List[Dict[str, Any]],
+    comparison_focus: str = "glycemic_impact",
+    top_k: Optional[int] = None
+) -> Dict[str, Any]:
     """
-    compare_products(products, comparison_focus?)
+    compare_products(products, comparison_focus?, top_k?)
     Each product dict can include:
       name, carbs, fiber, sugars, protein, glycemic_index
+    With top_k, only the k best are selected (heap, O(n log k)) and returned.
     """
     scored = []
-    for p in products:
+    for i, p in enumerate(products):
         carbs = float(p.get("carbs", 0) or 0)
         fiber = float(p.get("fiber", 0) or 0)
         sugars = float(p.get("sugars", 0) or 0)
@@ -199,13 +570,15 @@ def compare_products(products: List[Dict[str, Any]], comparison_focus: str = "gl
             # GI might be unknown; proxy using net carbs and sugars
             score = 100 - (net_carbs * 2) - (sugars * 1.5) - (gi * 0.3)
 
-        scored.append({
-            "name": p.get("name"),
-            "score": round(score, 1),
-            "net_carbs": round(net_carbs, 1)
-        })
+        scored.append((round(score, 1), i, round(net_carbs, 1)))
+
+    # both paths are stable: ties keep input order
+    if top_k is None:
+        scored.sort(key=lambda x: x[0], reverse=True)
+    else:
+        scored = heapq.nlargest(max(0, top_k), scored, key=lambda x: x[0])
+    scored = [{"name": products[i].get("name"), "score": score, "net_carbs": net} for score, i, net in scored]
 
-    scored.sort(key=lambda x: x["score"], reverse=True)
     return {
         "ok": True,
         "comparison_focus": comparison_focus,
@@ -214,41 +587,55 @@ def compare_products(products: List[Dict[str, Any]], comparison_focus: str = "gl
     }
 
 
-def suggest_alternatives(original_product: str, category: str, preferences: Optional[List[str]] = None) -> Dict[str, Any]:
+def _alternative_rank(f: Dict[str, Any]):
+    # prefer higher fiber, lower carbs/sugars/sodium
+    return (
+        -(f.get("fiber", 0) or 0),
+        (f.get("total_carbs", 0) or 0),
+        (f.get("sugars", 0) or 0),
+        (f.get("sodium", 0) or 0)
+    )
+
+
+def suggest_alternatives(
+    original_product: str,
+    category: str,
+    preferences: Optional[List[str]] = None,
+    limit: int = 8
+) -> Dict[str, Any]:
     """
-    suggest_alternatives(original_product, category, preferences?)
+    suggest_alternatives(original_product, category, preferences?, limit?)
     Implementation: return items from foods with same category, filtered by preferences/tags if available.
+    Only the best `limit` foods are selected (heap) and turned into result dicts.
     """
-    data = _load_data()
-    cat = _normalize_text(category)
     prefs = [_normalize_text(x) for x in (preferences or [])]
 
-    candidates = []
-    for f in data.get("foods", []):
-        if _normalize_text(f.get("category")) != cat:
-            continue
-        tags = [_normalize_text(t) for t in f.get("tags", [])]
-        if prefs and not any(p in tags for p in prefs):
-            continue
-
-        candidates.append({
-            "food_name": f.get("food_name"),
-            "tags": f.get("tags", []),
-            "calories": f.get("calories", 0),
-            "total_carbs": f.get("total_carbs", 0),
-            "fiber": f.get("fiber", 0),
-            "sugars": f.get("sugars", 0),
-            "sodium": f.get("sodium", 0)
-        })
+    candidates = _index().foods_in_category(category)
+    if prefs:
+        wanted = set(prefs)
+        candidates = (
+            f for f in candidates
+            if not wanted.isdisjoint(_normalize_text(t) for t in f.get("tags", []))
+        )
+    best = heapq.nsmallest(max(0, limit), candidates, key=_alternative_rank)
 
-    # prefer higher fiber, lower carbs/sugars/sodium
-    candidates.sort(key=lambda x: (-(x["fiber"] or 0), (x["total_carbs"] or 0), (x["sugars"] or 0), (x["sodium"] or 0)))
     return {
         "ok": True,
         "original_product": original_product,
         "category": category,
         "preferences": preferences or [],
-        "alternatives": candidates[:8]
+        "alternatives": [
+            {
+                "food_name": f.get("food_name"),
+                "tags": f.get("tags", []),
+                "calories": f.get("calories", 0),
+                "total_carbs": f.get("total_carbs", 0),
+                "fiber": f.get("fiber", 0),
+                "sugars": f.get("sugars", 0),
+                "sodium": f.get("sodium", 0)
+            }
+            for f in best
+        ]
     }
 
 
@@ -261,13 +648,8 @@ def calculate_meal_impact(meal_components: List[Dict[str, Any]]) -> Dict[str, An
     total_carbs = sum(float(x.get("carbs", 0) or 0) for x in meal_components)
 
     # try to estimate sugars from foods by name (optional)
-    data = _load_data()
-    total_sugars = 0.0
-    for x in meal_components:
-        fn = _normalize_text(x.get("food", ""))
-        f = next((ff for ff in data.get("foods", []) if _normalize_text(ff.get("food_name")) == fn), None)
-        if f:
-            total_sugars += float(f.get("sugars", 0) or 0)
+    _, values = _index().food_nutrients([x.get("food", "") for x in meal_components])
+    total_sugars = float(values[:, COL["sugars"]].sum())
 
     if total_carbs >= 60 or total_sugars >= 25:
         impact = "HIGH"
@@ -291,57 +673,46 @@ def review_cart(cart_items: List[Dict[str, Any]], meal_planning: bool = False) -
     cart_items example:
       [{"name": "White Rice", "quantity": 1}, {"name": "Grilled Fish", "quantity": 2}]
     """
-    data = _load_data()
+    names = [item.get("name", "") for item in cart_items]
+    qtys = np.array([float(item.get("quantity", 1) or 1) for item in cart_items], dtype=np.float64)
+    foods, values = _index().food_nutrients(names)
+    found = np.array([f is not None for f in foods], dtype=bool)
+
+    # one (n_found, 6) matrix for the whole cart: calories, carbs, sugars, protein, fiber, sodium
+    macros = values * qtys[found][:, None]
+    totals = macros.sum(axis=0).tolist()
+    high_sugar = (macros[:, COL["sugars"]] >= 20).tolist()
+    high_carb = (macros[:, COL["total_carbs"]] >= 60).tolist()
+    high_sodium = (macros[:, COL["sodium"]] >= 600).tolist()
+    macro_rows = macros.tolist()
 
     analyzed = []
     warnings = []
-    total_calories = 0.0
-    total_carbs = 0.0
-    total_sugars = 0.0
-    total_protein = 0.0
-    total_fiber = 0.0
-    total_sodium = 0.0
-
-    for item in cart_items:
-        name = item.get("name", "")
-        qty = float(item.get("quantity", 1) or 1)
-
-        food = _find_food_by_name(data, name)
-        if not food:
+    k = 0
+    for name, qty, food in zip(names, qtys.tolist(), foods):
+        if food is None:
             analyzed.append({"name": name, "quantity": qty, "found": False})
             warnings.append(f"Item not found in foods DB: {name}")
             continue
 
-        calories = float(food.get("calories", 0) or 0) * qty
-        carbs = float(food.get("total_carbs", 0) or 0) * qty
-        sugars = float(food.get("sugars", 0) or 0) * qty
-        protein = float(food.get("protein", 0) or 0) * qty
-        fiber = float(food.get("fiber", 0) or 0) * qty
-        sodium = float(food.get("sodium", 0) or 0) * qty
-
-        total_calories += calories
-        total_carbs += carbs
-        total_sugars += sugars
-        total_protein += protein
-        total_fiber += fiber
-        total_sodium += sodium
+        calories, carbs, sugars, protein, fiber, sodium = macro_rows[k]
 
         # simple flags
-        tags = food.get("tags", [])
         flags = []
-        if sugars >= 20:
+        if high_sugar[k]:
             flags.append("high-sugar")
-        if carbs >= 60:
+        if high_carb[k]:
             flags.append("high-carb")
-        if sodium >= 600:
+        if high_sodium[k]:
             flags.append("high-sodium")
+        k += 1
 
         analyzed.append({
             "name": food.get("food_name"),
             "quantity": qty,
             "found": True,
             "category": food.get("category"),
-            "tags": tags,
+            "tags": food.get("tags", []),
             "macros": {
                 "calories": round(calories, 1),
                 "carbs": round(carbs, 1),
@@ -353,6 +724,8 @@ def review_cart(cart_items: List[Dict[str, Any]], meal_planning: bool = False) -
             "flags": flags
         })
 
+    total_calories, total_carbs, total_sugars, total_protein, total_fiber, total_sodium = totals
+
     # cart-level warnings
     if total_sugars >= 40:
         warnings.append("Cart sugar is high (estimated).")
@@ -385,19 +758,7 @@ def check_ingredient_concerns(ingredients_list: List[str], product_category: Opt
         added sugar, high sodium additives, trans fats, etc.
     """
     ings = [_normalize_text(x) for x in ingredients_list]
-    concerns = []
-
-    sugar_terms = {"sugar", "glucose", "fructose", "corn syrup", "high fructose corn syrup", "dextrose"}
-    sodium_terms = {"sodium", "msg", "monosodium glutamate", "sodium benzoate", "sodium nitrite"}
-    fat_terms = {"hydrogenated", "partially hydrogenated", "trans fat"}
-
-    for ing in ings:
-        if any(term in ing for term in sugar_terms):
-            concerns.append({"ingredient": ing, "concern": "added_sugar", "severity": "moderate"})
-        if any(term in ing for term in sodium_terms):
-            concerns.append({"ingredient": ing, "concern": "high_sodium_additive", "severity": "moderate"})
-        if any(term in ing for term in fat_terms):
-            concerns.append({"ingredient": ing, "concern": "unhealthy_fat", "severity": "high"})
+    concerns = _concern_matcher().scan(ings)
 
     return {
         "ok": True,
@@ -408,6 +769,30 @@ def check_ingredient_concerns(ingredients_list: List[str], product_category: Opt
     }
 
 
+def check_ingredient_concerns_batch(
+    ingredient_lists: List[List[str]],
+    product_names: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    check_ingredient_concerns_batch(ingredient_lists, product_names?)
+    check_ingredient_concerns for many products in one scan; results[i] matches
+    check_ingredient_concerns(ingredient_lists[i]) (without product_category).
+    """
+    normalized = [[_normalize_text(x) for x in ings] for ings in ingredient_lists]
+    scanned = _concern_matcher().scan_batch(normalized)
+    results = [
+        {"ingredients_checked": len(ings), "concerns": concerns, "has_concerns": len(concerns) > 0}
+        for ings, concerns in zip(ingredient_lists, scanned)
+    ]
+    return {
+        "ok": True,
+        "count": len(results),
+        "product_names": product_names,
+        "results": results,
+        "flagged": [i for i, r in enumerate(results) if r["has_concerns"]]
+    }
+
+
 def get_portion_guidance(food_category: str, food_item: str, meal_context: Optional[str] = None) -> Dict[str, Any]:
     """
     get_portion_guidance(food_category, food_item, meal_context?)
@@ -445,31 +830,35 @@ def get_portion_guidance(food_category: str, food_item: str, meal_context: Optio
 def log_user_preference(item: str, preference_type: str, notes: Optional[str] = None) -> Dict[str, Any]:
     """
     log_user_preference(item, preference_type, notes?)
-    Mock: store in a local file "user_preferences.json" (simple simulation)
+    Appends one JSON line to PREF_FILE (see preference_log.py); no rewrite of old records.
     preference_type examples: like, dislike, avoid, allergy
     """
-    pref_file = "user_preferences.json"
-
     record = {
         "item": item,
         "preference_type": preference_type,
         "notes": notes or ""
     }
 
-    # load existing
-    try:
-        with open(pref_file, "r", encoding="utf-8") as f:
-            prefs = json.load(f)
-            if not isinstance(prefs, list):
-                prefs = []
-    except FileNotFoundError:
-        prefs = []
-    except json.JSONDecodeError:
-        prefs = []
+    _pref_log.append(record)
 
-    prefs.append(record)
+    return {"ok": True, "saved_to": _pref_log.path, "record": record}
 
-    with open(pref_file, "w", encoding="utf-8") as f:
-        json.dump(prefs, f, ensure_ascii=False, indent=2)
 
-    return {"ok": True, "saved_to": pref_file, "record": record}
\ No newline at end of file
+def get_user_preferences(
+    item: Optional[str] = None,
+    preference_type: Optional[str] = None,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """
+    get_user_preferences(item?, preference_type?, limit?)
+    Streams the preference log and returns matching records (oldest first).
+    """
+    _pref_log.flush()
+    records = _pref_log.query(item=item, preference_type=preference_type, limit=limit)
+    return {
+        "ok": True,
+        "item": item,
+        "preference_type": preference_type,
+        "count": len(records),
+        "preferences": records
+    }
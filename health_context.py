@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from data_store import BaseIndex, DataDiff, has_words, normalize_text, singular_text
+
+# ---------------------------
+# Per-user health context shared by the user-facing tools
+# ---------------------------
+# What the tools derive from a user record (normalized medications,
+# conditions and allergies, the foods their drugs forbid with the
+# interaction notes, the meal plan matching their conditions) is built once
+# per (user, data version) and reused by every later call, so a follow-up
+# check in a session is a dict lookup plus a short allergy scan.
+
+CONTEXT_CACHE_SIZE = 4096 # users whose context is kept (LRU)
+VERDICT_CACHE_SIZE = 256 # food checks remembered per user
+
+Verdict = Tuple[List[Tuple[str, str]], List[str]]
+
+
+class HealthContext:
+    """Derived health data of one user for one data version (read-only once built)."""
+
+    def __init__(self, index: BaseIndex, user: Dict[str, Any]):
+        self.user = user
+        self.user_id = user.get("user_id")
+        self.medications: List[str] = list(user.get("medications", []))
+        self.meds: FrozenSet[str] = frozenset(normalize_text(m) for m in self.medications)
+        self.conditions: FrozenSet[str] = frozenset(normalize_text(c) for c in user.get("chronic_diseases", []))
+        self.allergies: Tuple[str, ...] = tuple(
+            dict.fromkeys(a for a in (normalize_text(x) for x in user.get("allergies", [])) if a)
+        )
+        self._allergy_stems: Tuple[str, ...] = tuple(singular_text(a) for a in self.allergies)
+
+        # normalized food -> [(drug_name, notes)] of this user's drugs, in the
+        # same order as the shared inverted index
+        self.forbidden: Dict[str, List[Tuple[str, str]]] = {}
+        for med in self.meds:
+            drug = index.get_drug(med)
+            for food in {normalize_text(x) for x in (drug or {}).get("avoid_foods", [])}:
+                if food not in self.forbidden:
+                    self.forbidden[food] = [
+                        e for e in index.interactions_for_food(food) if normalize_text(e[0]) in self.meds
+                    ]
+
+        self.matched_condition: Optional[str] = None
+        self.meal_plan: Optional[Dict[str, Any]] = None
+        for d in user.get("chronic_diseases", []):
+            plan = index.meal_plan_for_condition(d)
+            if plan:
+                self.matched_condition, self.meal_plan = d, plan
+                break
+
+        self._verdicts: Dict[str, Verdict] = {}
+
+    def allergens(self, index: BaseIndex, food_name: str) -> List[str]:
+        """
+        Allergies that are whole words of the food's name, or equal its
+        catalogue category / a tag, compared in singular form ("peanuts"
+        flags "peanut butter", "egg" does not flag "eggplant").
+        """
+        if not self.allergies:
+            return []
+        food = index.find_food(food_name) or {}
+        labels = {food.get("category")} | set(food.get("tags", []))
+        name_stem = singular_text(food_name)
+        label_stems = {singular_text(x) for x in labels}
+        return [
+            a for a, stem in zip(self.allergies, self._allergy_stems)
+            if stem and (has_words(name_stem, stem) or stem in label_stems)
+        ]
+
+    def check(self, index: BaseIndex, food_name: Optional[str]) -> Verdict:
+        """([(drug_name, notes)], [allergen]) for one food; both checks in one memoized pass."""
+        key = normalize_text(food_name)
+        verdict = self._verdicts.get(key)
+        if verdict is None:
+            # a racing duplicate build is harmless
+            verdict = (self.forbidden.get(key, []), self.allergens(index, key))
+            if len(self._verdicts) < VERDICT_CACHE_SIZE:
+                self._verdicts[key] = verdict
+        return verdict
+
+
+class HealthContextCache:
+    """LRU of HealthContext per user_id for one index version."""
+
+    def __init__(self, index: BaseIndex, size: int = CONTEXT_CACHE_SIZE):
+        self.index = index
+        self.size = size
+        self._lock = threading.Lock()
+        self._contexts: "OrderedDict[Any, HealthContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: Any) -> Optional[HealthContext]:
+        """Context of the user, or None if there is no such user."""
+        with self._lock:
+            ctx = self._contexts.get(user_id)
+            if ctx is not None:
+                self._contexts.move_to_end(user_id)
+                self.hits += 1
+                return ctx
+            self.misses += 1
+
+        user = self.index.get_user(user_id)
+        if not user:
+            return None
+        ctx = HealthContext(self.index, user)
+        with self._lock:
+            self._contexts[user_id] = ctx
+            while len(self._contexts) > self.size:
+                self._contexts.popitem(last=False)
+        return ctx
+
+    def rebased(self, index: BaseIndex, diff: DataDiff) -> "HealthContextCache":
+        """
+        Cache for a newer index: keeps the contexts of users the diff does not
+        affect (users on a changed drug count as affected), unless foods
+        changed (cached allergy verdicts read the catalogue) or a meal plan
+        for one of their conditions did.
+        """
+        new = HealthContextCache(index, self.size)
+        if diff.foods_changed:
+            return new
+        with self._lock:
+            new._contexts = OrderedDict(
+                (uid, ctx) for uid, ctx in self._contexts.items()
+                if uid not in diff.affected_users and ctx.conditions.isdisjoint(diff.meal_plans)
+            )
+        return new
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"contexts": len(self._contexts), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,128 @@
+import json
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Mapping, Pattern, Sequence, Tuple
+
+from data_store import normalize_text
+
+# ---------------------------
+# Compiled multi-term ingredient matcher
+# ---------------------------
+# A concern dictionary maps a term to (concern, severity). An ingredient has a
+# concern when any of its terms occurs in it as a substring (same rule as the
+# old `term in ingredient` loops). Terms are compiled into one trie-shaped
+# regex per (concern, severity), so scanning costs one regex pass per group
+# instead of one `in` per term, and a whole catalogue of ingredient lists can
+# be scanned in a single pass per group (scan_batch).
+
+SEVERITY_RANK = {"low": 0, "moderate": 1, "high": 2}
+
+DEFAULT_CONCERNS: Dict[str, Tuple[str, str]] = {
+    "sugar": ("added_sugar", "moderate"),
+    "glucose": ("added_sugar", "moderate"),
+    "fructose": ("added_sugar", "moderate"),
+    "corn syrup": ("added_sugar", "moderate"),
+    "high fructose corn syrup": ("added_sugar", "moderate"),
+    "dextrose": ("added_sugar", "moderate"),
+    "sodium": ("high_sodium_additive", "moderate"),
+    "msg": ("high_sodium_additive", "moderate"),
+    "monosodium glutamate": ("high_sodium_additive", "moderate"),
+    "sodium benzoate": ("high_sodium_additive", "moderate"),
+    "sodium nitrite": ("high_sodium_additive", "moderate"),
+    "hydrogenated": ("unhealthy_fat", "high"),
+    "partially hydrogenated": ("unhealthy_fat", "high"),
+    "trans fat": ("unhealthy_fat", "high"),
+}
+
+
+def _trie_pattern(terms: Sequence[str]) -> str:
+    """
+    Regex matching any of `terms` as a substring, shaped like a trie so shared
+    prefixes are tested once. A term that is a prefix of longer ones ends its
+    branch: for "does any term occur" the longer terms add nothing.
+    """
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        if "" in node:
+            return ""
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items())]
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return build(trie)
+
+
+class IngredientMatcher:
+    def __init__(self, concerns: Mapping[str, Tuple[str, str]] = DEFAULT_CONCERNS):
+        # concern -> [(severity, pattern)] with the most severe group first
+        grouped: Dict[str, Dict[str, List[str]]] = {}
+        for term, (concern, severity) in concerns.items():
+            term = normalize_text(term)
+            if term:
+                grouped.setdefault(concern, {}).setdefault(severity, []).append(term)
+
+        self.groups: List[Tuple[str, List[Tuple[str, Pattern]]]] = []
+        for concern, by_severity in grouped.items():
+            levels = sorted(by_severity, key=lambda s: SEVERITY_RANK.get(s, -1), reverse=True)
+            self.groups.append((concern, [(s, re.compile(_trie_pattern(by_severity[s]))) for s in levels]))
+
+    @classmethod
+    def from_file(cls, path: str) -> "IngredientMatcher":
+        """
+        Load a concern dictionary from JSON:
+          {"aspartame": {"concern": "sweetener", "severity": "low"}, ...}
+        or {"aspartame": ["sweetener", "low"], ...}.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        concerns = {}
+        for term, spec in raw.items():
+            if isinstance(spec, dict):
+                concerns[term] = (spec["concern"], spec.get("severity", "moderate"))
+            else:
+                concerns[term] = (spec[0], spec[1])
+        return cls(concerns)
+
+    def scan(self, ingredients: Sequence[str]) -> List[Dict[str, str]]:
+        """Concerns for one ingredient list (ingredients must already be normalized)."""
+        return self.scan_batch([ingredients])[0]
+
+    def scan_batch(self, ingredient_lists: Sequence[Sequence[str]]) -> List[List[Dict[str, str]]]:
+        """
+        Concerns for many ingredient lists at once: ingredient order, then
+        dictionary concern order, one entry per (ingredient, concern) with the
+        highest matching severity.
+        """
+        flat = [ing for ings in ingredient_lists for ing in ings]
+        # ingredients joined by newlines; terms never contain one, so matches stay inside an ingredient
+        text = "\n".join(ing.replace("\n", " ") for ing in flat)
+        starts, pos = [], 0
+        for ing in flat:
+            starts.append(pos)
+            pos += len(ing) + 1
+
+        found: List[Dict[str, str]] = [{} for _ in flat]
+        for concern, levels in self.groups:
+            for severity, pattern in levels:
+                for m in pattern.finditer(text):
+                    hits = found[bisect_right(starts, m.start()) - 1]
+                    hits.setdefault(concern, severity)
+
+        out: List[List[Dict[str, str]]] = []
+        i = 0
+        for ings in ingredient_lists:
+            concerns = []
+            for ing in ings:
+                hits = found[i]
+                i += 1
+                for concern, _ in self.groups:
+                    if concern in hits:
+                        concerns.append({"ingredient": ing, "concern": concern, "severity": hits[concern]})
+            out.append(concerns)
+        return out
+
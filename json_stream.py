@@ -0,0 +1,90 @@
+import json
+import re
+from typing import Any, Iterator, List, Tuple
+
+# ---------------------------
+# JSON values embedded in (streamed) model text
+# ---------------------------
+# Model replies are supposed to be bare JSON, but may come wrapped in prose
+# or a ```json fence. JsonStreamExtractor follows bracket nesting (and JSON
+# strings, so brackets inside them don't count) chunk by chunk and hands out
+# every top-level {...} / [...] that parses, the moment its closing bracket
+# arrives. iter_json_values() is the non-streaming counterpart for a
+# complete text.
+
+_OPENERS = re.compile(r"[{\[]")
+_CLOSER = {"{": "}", "[": "]"}
+
+
+class JsonStreamExtractor:
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._start = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[Any, str]]:
+        """Append a chunk; returns [(value, raw_json)] for each value completed by it."""
+        self.text += chunk
+        text = self.text
+        found = []
+        i = self._pos
+        n = len(text)
+        while i < n:
+            if not self._stack:
+                # outside JSON: jump to the next opening bracket
+                m = _OPENERS.search(text, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.start()
+                self._start = i
+                self._stack.append(_CLOSER[text[i]])
+                i += 1
+                continue
+
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSER:
+                self._stack.append(_CLOSER[ch])
+            elif ch == "}" or ch == "]":
+                if ch != self._stack.pop():
+                    # mismatched brackets: this was not JSON, look further on
+                    self._stack.clear()
+                elif not self._stack:
+                    raw = text[self._start:i + 1]
+                    try:
+                        found.append((json.loads(raw), raw))
+                    except ValueError:
+                        pass
+            i += 1
+        self._pos = i
+        return found
+
+
+def iter_json_values(text: str) -> Iterator[Tuple[Any, str]]:
+    """(value, raw_json) for each JSON object / array in text, first to last."""
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        m = _OPENERS.search(text, pos)
+        if m is None:
+            return
+        try:
+            value, end = decoder.raw_decode(text, m.start())
+        except ValueError:
+            # not JSON from here (e.g. a bracket in prose); try the next bracket
+            pos = m.start() + 1
+            continue
+        yield value, text[m.start():end]
+        pos = end
@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import metrics
+
+# ---------------------------
+# Scheduler for model requests (bounded concurrency, priorities, coalescing)
+# ---------------------------
+# At most `max_in_flight` requests are sent to Ollama at once; the rest wait
+# in a priority queue (interactive before batch, FIFO within a priority)
+# instead of piling up inside the model server. Identical requests (same
+# coalescing key) that overlap in time share one model call.
+#
+#   async with scheduler.slot("interactive"):
+#       ... stream a reply ...
+#
+#   resp = await scheduler.run(lambda: client.chat(messages), "interactive", key=...)
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class LLMScheduler:
+    """asyncio-only; use it from the event loop that runs the model calls."""
+
+    def __init__(self, max_in_flight: int = 2):
+        self.max_in_flight = max(1, max_in_flight)
+        self._active = 0
+        self._seq = itertools.count()
+        # (priority rank, arrival order, future resolved when a slot is handed over)
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._shared: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.coalesced = 0
+
+    # ---- slots ----
+
+    async def acquire(self, priority: str = "interactive") -> None:
+        start = time.perf_counter()
+        if self._active < self.max_in_flight and not self._waiters:
+            self._active += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    # the slot was handed to us just as we were cancelled: pass it on
+                    self.release()
+                raise
+        metrics.observe("llm_queue", priority, time.perf_counter() - start)
+
+    def release(self) -> None:
+        # hand the slot straight to the next live waiter, so the count never dips
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive") -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ---- calls ----
+
+    async def _run_in_slot(self, call: Callable[[], Awaitable[Any]], priority: str) -> Any:
+        async with self.slot(priority):
+            return await call()
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        priority: str = "interactive",
+        key: Optional[Hashable] = None
+    ) -> Any:
+        """
+        Await call() once a slot is free. With a key, a caller arriving while
+        an identical call is queued or running gets that call's result
+        instead (treat it as read-only; it is shared).
+        """
+        if key is None:
+            return await self._run_in_slot(call, priority)
+
+        task = self._shared.get(key)
+        if task is not None:
+            self.coalesced += 1
+            with metrics.timed("llm", "chat_coalesced"):
+                # shielded: one caller giving up must not cancel the others' call
+                return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._run_in_slot(call, priority))
+        self._shared[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        self._shared.pop(key, None)
+        if not task.cancelled():
+            # retrieved so an error nobody is waiting for any more is not reported as unhandled
+            task.exception()
+
+    # ---- introspection ----
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {name: 0 for name in PRIORITIES}
+        names = {rank: name for name, rank in PRIORITIES.items()}
+        for rank, _, fut in self._waiters:
+            if not fut.done():
+                depth[names[rank]] += 1
+        return depth
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._active,
+            "queued": self.queue_depth(),
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,278 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_store import BaseIndex, has_words, normalize_text, singular_text
+from nutrient_table import COL
+
+# ---------------------------
+# Personalized meal plans composed from the foods catalogue
+# ---------------------------
+# A food is eligible for a user when it passes the rules of *every* condition
+# they have, is on none of their drugs' avoid lists and matches none of their
+# allergies. Per-condition / per-category / per-tag eligibility is computed
+# once per data version as boolean masks over the catalogue, so a user's
+# eligible set is a handful of vector ANDs. Plans are cached per
+# (conditions, medications, allergies, days) signature: residents with the
+# same profile share one plan computation.
+
+# nutrient limits (per serving) and excluded tags; conditions not listed here add no restriction
+CONDITION_RULES: Dict[str, Dict[str, Any]] = {
+    "diabetes": {"max": {"sugars": 15, "total_carbs": 45}, "exclude_tags": ["high-glycemic"]},
+    "hypertension": {"max": {"sodium": 400}, "exclude_tags": ["high-sodium"]},
+    "heart disease": {"max": {"sodium": 400}, "exclude_tags": ["high-sodium", "high-fat", "processed"]},
+    "kidney disease": {"max": {"sodium": 300, "protein": 30}, "exclude_tags": ["high-sodium"]},
+    "high cholesterol": {"exclude_tags": ["high-fat", "processed"]},
+}
+
+# meal -> courses; each course takes one food from the first matching categories
+MEAL_TEMPLATE: Dict[str, List[Tuple[str, ...]]] = {
+    "breakfast": [("dairy", "cereal", "bread"), ("fruit",)],
+    "lunch": [("protein",), ("carbs", "bread"), ("vegetables",)],
+    "dinner": [("protein",), ("vegetables", "carbs")],
+}
+
+PLAN_CACHE_SIZE = 4096
+MASK_CACHE_SIZE = 512 # condition / category / tag masks kept (one bool per food each), least recently used evicted first
+ALLERGY_MASK_CACHE_SIZE = 512 # allergy masks, in their own LRU so rare allergens never evict the masks above
+
+Signature = Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...], int]
+
+
+def _norm_set(values: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    return tuple(sorted({normalize_text(v) for v in (values or []) if normalize_text(v)}))
+
+
+class MealPlanner:
+    """Precomputed eligibility for one index version (never mutated after the masks are cached)."""
+
+    def __init__(self, index: BaseIndex, cache_size: int = PLAN_CACHE_SIZE):
+        self.index = index
+        # columns only: a database backend never decodes the whole catalogue here
+        names_norm, categories, rows_by_tag, values = index.food_columns()
+        self.food_count = len(names_norm)
+        self._categories = np.array(categories, dtype=str)
+        self._rows_by_tag: Dict[str, List[int]] = rows_by_tag
+        # singular forms of each food's category and tags (allergy matching)
+        self._rows_by_label_stem: Dict[str, List[int]] = {}
+        for row, category in enumerate(categories):
+            self._rows_by_label_stem.setdefault(singular_text(category), []).append(row)
+        for tag, rows in rows_by_tag.items():
+            self._rows_by_label_stem.setdefault(singular_text(tag), []).extend(rows)
+        self._row_by_name: Dict[str, int] = {}
+        for row, name in enumerate(names_norm):
+            self._row_by_name.setdefault(name, row)
+        # singular_text() names and their words -> rows, so an allergen's rows are one dict lookup
+        self._stem_names = [singular_text(n) for n in names_norm]
+        self._rows_by_name_word: Dict[str, List[int]] = {}
+        for row, stem in enumerate(self._stem_names):
+            for word in dict.fromkeys(stem.split()):
+                self._rows_by_name_word.setdefault(word, []).append(row)
+
+        self._values = values
+        # best first: fiber and protein up, sugar and sodium down
+        score = (
+            2.0 * values[:, COL["fiber"]] + 0.5 * values[:, COL["protein"]]
+            - values[:, COL["sugars"]] - values[:, COL["sodium"]] / 200.0
+        )
+        self._order = np.argsort(-score, kind="stable")
+
+        # shared with rebased() copies, together with its lock
+        self._masks: "OrderedDict[Any, np.ndarray]" = OrderedDict()
+        self._allergy_masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._mask_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[Signature, Dict[str, Any]]" = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def rebased(self, index: BaseIndex, changed_drugs: Iterable[str]) -> "MealPlanner":
+        """
+        Planner for a newer index with the same foods: the masks are shared and
+        cached plans are kept unless a medication in their signature changed.
+        """
+        changed = set(changed_drugs)
+        new = copy.copy(self)
+        new.index = index
+        new._lock = threading.Lock()
+        with self._lock:
+            new._plans = OrderedDict(
+                (sig, plan) for sig, plan in self._plans.items() if changed.isdisjoint(sig[1])
+            )
+        return new
+
+    # ---- masks ----
+
+    def _cached_mask(self, key: Any, build) -> np.ndarray:
+        return self._lru_mask(self._masks, MASK_CACHE_SIZE, key, build)
+
+    def _lru_mask(self, cache: "OrderedDict[Any, np.ndarray]", size: int, key: Any, build) -> np.ndarray:
+        with self._mask_lock:
+            mask = cache.get(key)
+            if mask is not None:
+                cache.move_to_end(key)
+                return mask
+        # built outside the lock (masks build other masks); a racing duplicate build is harmless
+        mask = build()
+        with self._mask_lock:
+            cache[key] = mask
+            while len(cache) > size:
+                cache.popitem(last=False)
+        return mask
+
+    def tag_mask(self, tag: str) -> np.ndarray:
+        def build() -> np.ndarray:
+            mask = np.zeros(self.food_count, dtype=bool)
+            mask[self._rows_by_tag.get(tag, [])] = True
+            return mask
+        return self._cached_mask(("tag", tag), build)
+
+    def category_mask(self, categories: Tuple[str, ...]) -> np.ndarray:
+        return self._cached_mask(("category", categories), lambda: np.isin(self._categories, categories))
+
+    def ranked_rows(self, categories: Tuple[str, ...]) -> np.ndarray:
+        """Rows in the categories, best score first."""
+        return self._cached_mask(
+            ("ranked", categories), lambda: self._order[self.category_mask(categories)[self._order]]
+        )
+
+    def _top_eligible(self, mask: np.ndarray, categories: Tuple[str, ...], n: int) -> List[int]:
+        # plans only need the first few eligible rows; widen the window only when the mask is sparse
+        ranked = self.ranked_rows(categories)
+        window = max(64, 4 * n)
+        while True:
+            head = ranked[:window]
+            rows = head[mask[head]]
+            if len(rows) >= n or window >= len(ranked):
+                return rows[:n].tolist()
+            window *= 4
+
+    def condition_mask(self, condition: str) -> np.ndarray:
+        def build() -> np.ndarray:
+            rule = CONDITION_RULES.get(condition, {})
+            mask = np.ones(self.food_count, dtype=bool)
+            for nutrient, limit in rule.get("max", {}).items():
+                mask &= self._values[:, COL[nutrient]] <= limit
+            for tag in rule.get("exclude_tags", []):
+                mask &= ~self.tag_mask(tag)
+            return mask
+        return self._cached_mask(("condition", condition), build)
+
+    def name_words_mask(self, words: str) -> np.ndarray:
+        """Foods whose singular_text() name has words (already singular_text()) as whole consecutive words."""
+        mask = np.zeros(self.food_count, dtype=bool)
+        parts = words.split()
+        if not parts:
+            return mask
+        postings = sorted((self._rows_by_name_word.get(w, []) for w in dict.fromkeys(parts)), key=len)
+        if len(parts) == 1:
+            mask[postings[0]] = True
+            return mask
+        # rows with every word, then only those where the words are consecutive
+        rows = set(postings[0]).intersection(*postings[1:])
+        mask[[r for r in rows if has_words(self._stem_names[r], words)]] = True
+        return mask
+
+    def allergy_mask(self, allergen: str) -> np.ndarray:
+        """
+        Foods whose name has the allergen as whole words, or whose category /
+        a tag equals it, in singular form (same rule as HealthContext.allergens).
+        """
+        def build() -> np.ndarray:
+            stem = singular_text(allergen)
+            mask = self.name_words_mask(stem)
+            if stem:
+                mask[self._rows_by_label_stem.get(stem, [])] = True
+            return mask
+        return self._lru_mask(self._allergy_masks, ALLERGY_MASK_CACHE_SIZE, allergen, build)
+
+    def eligible_mask(self, conditions: Sequence[str], medications: Sequence[str], allergies: Sequence[str]) -> np.ndarray:
+        """Arguments must already be normalized."""
+        mask = np.ones(self.food_count, dtype=bool)
+        for c in conditions:
+            mask &= self.condition_mask(c)
+        for a in allergies:
+            mask &= ~self.allergy_mask(a)
+        for m in medications:
+            drug = self.index.get_drug(m)
+            for food in (drug or {}).get("avoid_foods", []):
+                row = self._row_by_name.get(normalize_text(food))
+                if row is not None:
+                    mask[row] = False
+        return mask
+
+    # ---- plans ----
+
+    def plan(
+        self,
+        conditions: Optional[Iterable[str]],
+        medications: Optional[Iterable[str]],
+        allergies: Optional[Iterable[str]],
+        days: int = 7
+    ) -> Dict[str, Any]:
+        sig: Signature = (_norm_set(conditions), _norm_set(medications), _norm_set(allergies), days)
+        with self._lock:
+            cached = self._plans.get(sig)
+            if cached is not None:
+                self._plans.move_to_end(sig)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        result = self._build(*sig)
+        with self._lock:
+            self._plans[sig] = result
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+        return result
+
+    def _build(self, conditions: Tuple[str, ...], medications: Tuple[str, ...], allergies: Tuple[str, ...], days: int) -> Dict[str, Any]:
+        mask = self.eligible_mask(conditions, medications, allergies)
+
+        # enough candidates per course that every day can rotate past the foods already used that day
+        per_course = days + sum(len(courses) for courses in MEAL_TEMPLATE.values())
+        candidates: Dict[Tuple[str, ...], List[int]] = {}
+        for courses in MEAL_TEMPLATE.values():
+            for cats in courses:
+                if cats not in candidates:
+                    candidates[cats] = self._top_eligible(mask, cats, per_course)
+
+        # display names are only read for the candidate rows
+        chosen = sorted({row for rows in candidates.values() for row in rows})
+        names = dict(zip(chosen, self.index.food_names(chosen)))
+
+        plan_days = []
+        for day in range(days):
+            used = set()
+            meals: Dict[str, Any] = {"day": day + 1}
+            for meal, courses in MEAL_TEMPLATE.items():
+                items = []
+                for cats in courses:
+                    rows = candidates[cats]
+                    # rotate through the ranked candidates so days differ; no repeats within a day
+                    for k in range(len(rows)):
+                        row = rows[(day + k) % len(rows)]
+                        if row not in used:
+                            used.add(row)
+                            items.append(names[row])
+                            break
+                meals[meal] = items
+            plan_days.append(meals)
+
+        return {
+            "conditions": list(conditions),
+            "conditions_without_rules": [c for c in conditions if c not in CONDITION_RULES],
+            "medications": list(medications),
+            "allergies": list(allergies),
+            "eligible_foods": int(mask.sum()),
+            "unfilled_courses": ["/".join(cats) for cats, rows in candidates.items() if not rows],
+            "days": plan_days
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"plans_cached": len(self._plans), "hits": self.hits, "misses": self.misses}
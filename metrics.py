@@ -0,0 +1,284 @@
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ---------------------------
+# Call instrumentation (latency histograms, counts, errors, payload sizes)
+# ---------------------------
+# Every observation is keyed by (kind, name), e.g. ("tool", "search_foods"),
+# ("llm", "chat"), ("parse", "try_parse_tool_calls"). Export with
+# prometheus_text() or snapshot().
+#
+#   with metrics.timed("llm", "chat") as t:
+#       t.payload_in = ...
+#
+#   @metrics.instrument("parse")
+#   def try_parse_tool_calls(text): ...
+#
+# While disabled, timed() returns a shared no-op object and instrumented
+# functions call straight through, so the cost is one global lookup.
+#
+# Gauges (queue depths and the like) are callbacks read at export time:
+#   metrics.register_gauge("llm_in_flight", "Requests sent to Ollama.", lambda: {"": n})
+
+# histogram upper bounds, in seconds
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+_enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = bool(flag)
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "errors", "total", "max", "payload_in", "payload_out")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.payload_in = 0
+        self.payload_out = 0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(LATENCY_BUCKETS[i], self.max) if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        # name -> (help, label name, fn returning {label value: number})
+        self._gauges: Dict[str, Tuple[str, str, Callable[[], Dict[str, float]]]] = {}
+
+    def register_gauge(self, name: str, help: str, fn: Callable[[], Dict[str, float]], label: str = "") -> None:
+        """fn() -> {label value: number}; use {"": number} (and no label) for a single value."""
+        with self._lock:
+            self._gauges[name] = (help, label, fn)
+
+    def gauges(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        return {name: dict(fn()) for name, (_, _, fn) in gauges}
+
+    def observe(
+        self,
+        kind: str,
+        name: str,
+        seconds: float,
+        error: bool = False,
+        payload_in: int = 0,
+        payload_out: int = 0
+    ) -> None:
+        i = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            s = self._series.get((kind, name))
+            if s is None:
+                s = self._series[(kind, name)] = _Series()
+            s.buckets[i] += 1
+            s.count += 1
+            s.total += seconds
+            if seconds > s.max:
+                s.max = seconds
+            if error:
+                s.errors += 1
+            s.payload_in += payload_in
+            s.payload_out += payload_out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def _items(self) -> List[Tuple[Tuple[str, str], _Series]]:
+        with self._lock:
+            items = []
+            for key, s in sorted(self._series.items()):
+                copy = _Series()
+                copy.buckets = list(s.buckets)
+                for attr in ("count", "errors", "total", "max", "payload_in", "payload_out"):
+                    setattr(copy, attr, getattr(s, attr))
+                items.append((key, copy))
+            return items
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{kind: {name: {...}}} with latencies in milliseconds."""
+        out: Dict[str, Any] = {}
+        for (kind, name), s in self._items():
+            out.setdefault(kind, {})[name] = {
+                "count": s.count,
+                "errors": s.errors,
+                "mean_ms": round(s.total / s.count * 1000.0, 3) if s.count else 0.0,
+                "p50_ms": round(s.quantile(0.50) * 1000.0, 3),
+                "p90_ms": round(s.quantile(0.90) * 1000.0, 3),
+                "p99_ms": round(s.quantile(0.99) * 1000.0, 3),
+                "max_ms": round(s.max * 1000.0, 3),
+                "payload_in": s.payload_in,
+                "payload_out": s.payload_out
+            }
+        return out
+
+    def prometheus_text(self, prefix: str = "seniocare") -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        items = self._items()
+        hist = f"{prefix}_call_duration_seconds"
+        lines = [
+            f"# HELP {hist} Latency of tool, LLM and parsing calls.",
+            f"# TYPE {hist} histogram"
+        ]
+        for (kind, name), s in items:
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, s.buckets):
+                cumulative += n
+                lines.append(f'{hist}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{hist}_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f"{hist}_sum{{{labels}}} {s.total!r}")
+            lines.append(f"{hist}_count{{{labels}}} {s.count}")
+
+        errors = f"{prefix}_call_errors_total"
+        lines += [f"# HELP {errors} Calls that raised or returned ok=false.", f"# TYPE {errors} counter"]
+        for (kind, name), s in items:
+            lines.append(f'{errors}{{kind="{_escape(kind)}",name="{_escape(name)}"}} {s.errors}')
+
+        payload = f"{prefix}_payload_chars_total"
+        lines += [f"# HELP {payload} Characters sent to / returned by calls.", f"# TYPE {payload} counter"]
+        for (kind, name), s in items:
+            labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+            lines.append(f'{payload}{{{labels},direction="in"}} {s.payload_in}')
+            lines.append(f'{payload}{{{labels},direction="out"}} {s.payload_out}')
+
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        for name, (help, label, fn) in gauges:
+            full = f"{prefix}_{name}"
+            lines += [f"# HELP {full} {help}", f"# TYPE {full} gauge"]
+            for value_label, value in sorted(fn().items()):
+                labels = f'{{{label}="{_escape(value_label)}"}}' if label else ""
+                lines.append(f"{full}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+
+class Timer:
+    """Context manager recording one call; set error / payload_in / payload_out before exit."""
+
+    __slots__ = ("kind", "name", "error", "payload_in", "payload_out", "_start")
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.error = False
+        self.payload_in = 0
+        self.payload_out = 0
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        REGISTRY.observe(
+            self.kind, self.name, time.perf_counter() - self._start,
+            error=self.error or exc_type is not None,
+            payload_in=self.payload_in, payload_out=self.payload_out
+        )
+
+
+class _NullTimer:
+    """Shared stand-in while metrics are disabled; attribute writes are ignored."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(kind: str, name: str):
+    if not _enabled:
+        return _NULL_TIMER
+    return Timer(kind, name)
+
+
+def instrument(kind: str, name: Optional[str] = None):
+    """Decorator timing every call of a function (sync or async); exceptions count as errors."""
+
+    def decorate(fn):
+        label = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with Timer(kind, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Timer(kind, label):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def observe(kind: str, name: str, seconds: float, error: bool = False) -> None:
+    """Record a duration measured elsewhere (no-op while disabled)."""
+    if _enabled:
+        REGISTRY.observe(kind, name, seconds, error=error)
+
+
+def register_gauge(name: str, help: str, fn: Callable[[], Dict[str, float]], label: str = "") -> None:
+    REGISTRY.register_gauge(name, help, fn, label)
+
+
+def gauges() -> Dict[str, Dict[str, float]]:
+    return REGISTRY.gauges()
+
+
+def snapshot() -> Dict[str, Any]:
+    return REGISTRY.snapshot()
+
+
+def prometheus_text() -> str:
+    return REGISTRY.prometheus_text()
@@ -0,0 +1,41 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# ---------------------------
+# Columnar nutrient table (one row per food, same order as data["foods"])
+# ---------------------------
+
+NUTRIENT_COLUMNS = ("calories", "total_carbs", "sugars", "protein", "fiber", "sodium")
+COL = {name: i for i, name in enumerate(NUTRIENT_COLUMNS)}
+
+
+class NutrientTable:
+    """
+    float64 matrix of shape (n_foods, len(NUTRIENT_COLUMNS)).
+    Missing / null values are stored as 0, like `float(x or 0)` in the tools.
+    """
+
+    def __init__(self, foods: Sequence[Dict[str, Any]]):
+        self.values = np.array(
+            [[float(f.get(c, 0) or 0) for c in NUTRIENT_COLUMNS] for f in foods],
+            dtype=np.float64
+        ).reshape(len(foods), len(NUTRIENT_COLUMNS))
+
+    def updated(self, foods: Sequence[Dict[str, Any]], rows: Sequence[int]) -> "NutrientTable":
+        """Copy for `foods` (same rows plus any appended) where only `rows` are re-read."""
+        new = NutrientTable.__new__(NutrientTable)
+        new.values = np.zeros((len(foods), len(NUTRIENT_COLUMNS)), dtype=np.float64)
+        keep = min(len(foods), len(self.values))
+        new.values[:keep] = self.values[:keep]
+        if len(rows):
+            new.values[list(rows)] = NutrientTable([foods[r] for r in rows]).values
+        return new
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[:, COL[name]]
+
+
+def as_row_array(rows: List[int]) -> np.ndarray:
+    """Row ids with -1 for foods that were not found."""
+    return np.array(rows, dtype=np.intp)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+# ---------------------------
+# Async Ollama /api/chat client
+# ---------------------------
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class AsyncOllamaClient:
+    """
+    One pooled aiohttp session shared by every conversation in the process.
+    Connection setup is paid once per pooled connection, not once per turn.
+
+    chat()        -> full response JSON (like the old "stream": False call)
+    chat_stream() -> async iterator of content chunks as the model generates
+    """
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        max_connections: int = 16,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        retries: int = 2,
+        backoff: float = 0.5
+    ):
+        self.url = url
+        self.model = model
+        self.max_connections = max_connections
+        # sock_read bounds the gap between chunks, so long streams are fine
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncOllamaClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _payload(self, messages: List[Dict[str, str]], stream: bool, **options: Any) -> Dict[str, Any]:
+        payload = {"model": self.model, "messages": messages, "stream": stream}
+        payload.update(options)
+        return payload
+
+    async def _retry_wait(self, attempt: int) -> None:
+        await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def chat(self, messages: List[Dict[str, str]], **options: Any) -> Dict[str, Any]:
+        payload = self._payload(messages, stream=False, **options)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_session().post(self.url, json=payload) as r:
+                    if r.status == 200:
+                        return await r.json(content_type=None)
+                    text = await r.text()
+                    if r.status not in RETRY_STATUSES or attempt == self.retries:
+                        raise OllamaError(f"Ollama HTTP {r.status}: {text}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise OllamaError(f"Ollama request failed: {e!r}") from e
+            await self._retry_wait(attempt)
+        raise OllamaError("unreachable")
+
+    async def chat_stream(self, messages: List[Dict[str, str]], **options: Any) -> AsyncIterator[str]:
+        """
+        Yield message content chunks from Ollama's NDJSON stream.
+        Retries only happen before the first chunk was yielded.
+        """
+        payload = self._payload(messages, stream=True, **options)
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async with self._get_session().post(self.url, json=payload) as r:
+                    if r.status != 200:
+                        text = await r.text()
+                        if r.status not in RETRY_STATUSES or attempt == self.retries:
+                            raise OllamaError(f"Ollama HTTP {r.status}: {text}")
+                    else:
+                        async for line in r.content:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if "error" in chunk:
+                                raise OllamaError(f"Ollama error: {chunk['error']}")
+                            content = chunk.get("message", {}).get("content", "")
+                            if content:
+                                started = True
+                                yield content
+                            if chunk.get("done"):
+                                return
+                        return
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if started or attempt == self.retries:
+                    raise OllamaError(f"Ollama stream failed: {e!r}") from e
+            await self._retry_wait(attempt)
@@ -1,11 +1,42 @@
 from pyexpat.errors import messages
 
+import asyncio
 import functions  
 import json
+import metrics
+import re
 import requests
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+from json_stream import JsonStreamExtractor, iter_json_values
+from llm_scheduler import LLMScheduler
+from ollama_client import AsyncOllamaClient
+from prompt_budget import ConversationHistory, summarize_tool_result
+from tool_cache import ToolResultCache, make_key
 
 OLLAMA_URL = "http://localhost:11434/api/chat" # Change if your Ollama server is hosted elsewhere
 MODEL_NAME = "4customized_med42:latest" # Change to your model name
+OLLAMA_CONNECT_TIMEOUT = 5 # seconds
+OLLAMA_READ_TIMEOUT = 120 # seconds without any bytes from the model
+OLLAMA_RETRIES = 2
+TOOL_CACHE_SIZE = 1024 # cached tool results (LRU); 0 disables the cache
+TOOL_CACHE_TTL = 300 # seconds
+UNCACHED_TOOLS = {"log_user_preference", "get_user_preferences"} # side effects, or reads outside the data file: always run
+TOOL_WORKERS = 8 # threads for running several tool calls of one turn in parallel
+FAST_ROUTER_ENABLED = True # route obvious requests without asking the model
+TOOL_RESULT_TOKEN_BUDGET = 800 # approx. tokens of tool results sent back to the model per turn
+HISTORY_TOKEN_BUDGET = 1500 # approx. tokens of earlier turns kept; older turns are summarized
+LLM_MAX_IN_FLIGHT = 2 # model requests sent to Ollama at once by the async path; the rest queue (interactive before batch)
+STREAM_ROUTING = True # read the routing reply as a stream; tools start as soon as the first tool call JSON is complete
+COALESCE_ROUTING_CALLS = True # identical routing requests in flight at the same time share one model call
+METRICS_ENABLED = True # latency / error / payload metrics per tool and LLM call (see metrics.py)
+METRICS_TOOL_PAYLOADS = False # also count tool args / result sizes (serializes both on every tool call, cache hits included)
+
+metrics.set_enabled(METRICS_ENABLED)
 
 # ---------------------------
 # Tools (Schema) Definition
@@ -13,11 +44,14 @@ MODEL_NAME = "4customized_med42:latest" # Change to your model name
 
 SYSTEM_PROMPT = """
 You are a tool router for SenioCare.
-You must output ONLY ONE JSON object. No extra text.
+You must output ONLY JSON. No extra text.
 
 If you need a tool, output:
 {"tool":"TOOL_NAME","args":{...}}
 
+If the question needs several independent tools, output them all at once as an array:
+[{"tool":"TOOL_NAME","args":{...}}, {"tool":"TOOL_NAME","args":{...}}]
+
 If no tool needed, output: 
 {"tool":"no_tool","args":{"answer":"...final answer to user..."}}
 
@@ -27,26 +61,226 @@ Available tools:
 3) analyze_product(product_name:str, nutrition_info?:object, barcode?:str)
 4) check_drug_food_interactions(user_id:int, food_name:str)
 5) suggest_meal_plan_for_user(user_id:int)
+6) check_drug_food_interactions_batch(user_id:int, food_names:list[str])
+7) generate_meal_plan(user_id:int, days?:int)
 
 Rules:
 - Always output valid JSON.
 - Never explain tools.
 - Never output code blocks.
 """
+# ---------------------------
+# Fast-path router (no LLM call for obvious intents)
+# ---------------------------
+
+# only tools the model itself may call are routed
+ROUTABLE_TOOLS = set(re.findall(r"^\d+\)\s*(\w+)\(", SYSTEM_PROMPT, re.MULTILINE))
+
+_USER_ID_RE = re.compile(r"\buser(?:\s*id)?\s*(?:#|number|no\.?)?\s*(\d+)\b")
+_ANALYZE_RE = re.compile(r"^\s*analy[sz]e\s+(?:the\s+)?(?:product\s+)?(.+?)\s*[?.!]*\s*$")
+_PROFILE_RE = re.compile(r"\bprofile\b")
+_MEAL_PLAN_RE = re.compile(r"\bmeal\s*plans?\b")
+# a food is only routed to the interaction check when the message asks about eating / taking it
+_INTERACTION_RE = re.compile(
+    r"\b(?:eat(?:s|ing)?|drink(?:s|ing)?|take(?:s|n)?|taking|interact\w*|safe(?:ly)?|allowed|avoid(?:s|ed)?)\b"
+)
+# negated requests ("don't give user 1 a meal plan") are left to the model;
+# "no" before a number is the "user no. 2" form, not a negation
+_NEGATION_RE = re.compile(
+    r"\b(?:\w+n['\u2019]t|dont|doesnt|cant|cannot|shouldnt|wont|never|no(?!\.?\s*\d)|not|without|stop)\b"
+)
+_MAX_FOOD_WORDS = 6
+_MAX_FAST_PROMPT = 200 # longer messages are left to the model
+
+_router_lock = threading.Lock()
+_router_counts = Counter()
+
+def _mentioned_food(text: str):
+    """Longest (then leftmost) known food or avoid-list item named in text."""
+    idx = functions._index()
+    words = re.findall(r"[a-z0-9][a-z0-9'-]*", text)
+    for n in range(min(_MAX_FOOD_WORDS, len(words)), 0, -1):
+        for i in range(len(words) - n + 1):
+            phrase = " ".join(words[i:i + n])
+            food = idx.find_food(phrase)
+            if food:
+                return food.get("food_name")
+            if idx.interactions_for_food(phrase):
+                return phrase
+    return None
+
+@metrics.instrument("router")
+def fast_route(user_prompt: str):
+    """
+    Tool calls for prompts whose intent and arguments are unambiguous,
+    e.g. "meal plan for user 1", "can user 1 eat apple" or "analyze product
+    Wonder Bread"; None when the model should decide (including any
+    negated message, and a food named without asking about eating it).
+    """
+    text = functions._normalize_text(user_prompt)
+    if not text or len(text) > _MAX_FAST_PROMPT or _NEGATION_RE.search(text):
+        return None
+
+    m = _ANALYZE_RE.match(text)
+    if m:
+        food = functions._index().find_food(m.group(1))
+        if not food:
+            return None
+        return [{"tool": "analyze_product", "args": {"product_name": food.get("food_name")}}]
+
+    user_ids = {int(x) for x in _USER_ID_RE.findall(text)}
+    if len(user_ids) != 1:
+        return None
+    user_id = user_ids.pop()
+    if not functions._index().get_user(user_id):
+        return None
+
+    calls = []
+    food = _mentioned_food(text)
+    if food:
+        if not _INTERACTION_RE.search(text):
+            return None
+        calls.append({"tool": "check_drug_food_interactions", "args": {"user_id": user_id, "food_name": food}})
+    if _MEAL_PLAN_RE.search(text):
+        calls.append({"tool": "suggest_meal_plan_for_user", "args": {"user_id": user_id}})
+    if _PROFILE_RE.search(text):
+        calls.append({"tool": "get_user_profile", "args": {"user_id": user_id}})
+
+    if not calls or any(c["tool"] not in ROUTABLE_TOOLS for c in calls):
+        return None
+    return calls
+
+def _route(user_prompt: str):
+    """(tool_calls, assistant_text) from the fast path, or (None, None)."""
+    calls = fast_route(user_prompt) if FAST_ROUTER_ENABLED else None
+    with _router_lock:
+        _router_counts["fast_path" if calls else "llm"] += 1
+        for c in calls or ():
+            _router_counts["fast_path:" + c["tool"]] += 1
+    if not calls:
+        return None, None
+    # the model still writes the final answer, so show it the calls as if it made them
+    return calls, json.dumps(calls[0] if len(calls) == 1 else calls)
+
+def router_stats():
+    with _router_lock:
+        total = _router_counts["fast_path"] + _router_counts["llm"]
+        stats = dict(_router_counts)
+    stats["fast_path_rate"] = round(stats.get("fast_path", 0) / total, 4) if total else 0.0
+    return stats
+
 # ---------------------------
 # Connection to Ollama
 # ---------------------------
 
+# keep-alive connection reused across turns
+_session = requests.Session()
+
+def _content_chars(messages) -> int:
+    return sum(len(m.get("content") or "") for m in messages)
+
 def call_ollama(messages):
-    r = requests.post(OLLAMA_URL, json={
-        "model": MODEL_NAME,
-        "messages": messages,
-        "stream": False
-    })
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama HTTP {r.status_code}: {r.text}")
-    return r.json()
+    with metrics.timed("llm", "chat") as t:
+        r = _session.post(OLLAMA_URL, json={
+            "model": MODEL_NAME,
+            "messages": messages,
+            "stream": False
+        }, timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT))
+        if r.status_code != 200:
+            raise RuntimeError(f"Ollama HTTP {r.status_code}: {r.text}")
+        resp = r.json()
+        if metrics.enabled():
+            t.payload_in = _content_chars(messages)
+            t.payload_out = len(resp.get("message", {}).get("content") or "")
+        return resp
+
+_async_client = None
+
+def get_async_client() -> AsyncOllamaClient:
+    # one pooled client per process, shared by all concurrent conversations
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOllamaClient(
+            OLLAMA_URL, MODEL_NAME,
+            connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=OLLAMA_READ_TIMEOUT,
+            retries=OLLAMA_RETRIES
+        )
+    return _async_client
+
+scheduler = LLMScheduler(max_in_flight=LLM_MAX_IN_FLIGHT)
+
+metrics.register_gauge("llm_in_flight", "Model requests currently sent to Ollama.", lambda: {"": scheduler.stats()["in_flight"]})
+metrics.register_gauge(
+    "llm_queue_depth", "Model requests waiting for a slot.", scheduler.queue_depth, label="priority"
+)
+
+async def _achat(messages):
+    with metrics.timed("llm", "chat") as t:
+        resp = await get_async_client().chat(messages)
+        if metrics.enabled():
+            t.payload_in = _content_chars(messages)
+            t.payload_out = len(resp.get("message", {}).get("content") or "")
+        return resp
 
+def _coalesce_key(kind: str, messages, coalesce: bool):
+    if not (coalesce and COALESCE_ROUTING_CALLS):
+        return None
+    return (kind, json.dumps(messages, sort_keys=True, ensure_ascii=False))
+
+async def acall_ollama(messages, priority="interactive", coalesce=False):
+    """
+    One model call through `scheduler` (priority "interactive" or "batch").
+    coalesce=True: an identical request already in flight is shared; the
+    response dict is then shared too, so treat it as read-only.
+    """
+    return await scheduler.run(lambda: _achat(messages), priority, _coalesce_key("chat", messages, coalesce))
+
+async def _astream_route(messages):
+    extractor = JsonStreamExtractor()
+    with metrics.timed("llm", "chat_route") as t:
+        if metrics.enabled():
+            t.payload_in = _content_chars(messages)
+        # closing the stream early drops the connection, which stops the generation
+        async with aclosing(get_async_client().chat_stream(messages)) as stream:
+            async for chunk in stream:
+                for value, raw in extractor.feed(chunk):
+                    calls = _as_tool_calls(value)
+                    if calls:
+                        if metrics.enabled():
+                            t.payload_out = len(extractor.text)
+                        return raw, calls
+        if metrics.enabled():
+            t.payload_out = len(extractor.text)
+    return extractor.text, try_parse_tool_calls(extractor.text)
+
+async def aroute_ollama(messages, priority="interactive", coalesce=True):
+    """
+    Routing call read as a stream. Returns (assistant_text, tool_calls) as
+    soon as the first tool call (or array of calls) is complete, abandoning
+    the rest of the generation; otherwise (full reply, None). Identical
+    requests in flight share one call, like acall_ollama(coalesce=True).
+    """
+    return await scheduler.run(lambda: _astream_route(messages), priority, _coalesce_key("route", messages, coalesce))
+
+async def astream_ollama(messages, on_token, priority="interactive"):
+    """Stream the reply to on_token chunk by chunk and return the full text (holds a scheduler slot throughout)."""
+    parts = []
+    async with scheduler.slot(priority):
+        with metrics.timed("llm", "chat_stream") as t:
+            start = time.perf_counter()
+            async for chunk in get_async_client().chat_stream(messages):
+                if not parts:
+                    metrics.observe("llm", "chat_stream_first_token", time.perf_counter() - start)
+                parts.append(chunk)
+                on_token(chunk)
+            text = "".join(parts)
+            if metrics.enabled():
+                t.payload_in = _content_chars(messages)
+                t.payload_out = len(text)
+    return text
+
+@metrics.instrument("parse")
 def safe_json_loads(text: str):
     try:
         return json.loads(text.strip())
@@ -69,10 +303,126 @@ def try_parse_tool_call(text: str):
         return None
     return None
 
+def _is_tool_call(obj) -> bool:
+    return isinstance(obj, dict) and "tool" in obj and isinstance(obj.get("args"), dict)
+
+def _as_tool_calls(value):
+    """A tool call or a non-empty array of them as a list of calls, else None."""
+    if _is_tool_call(value):
+        return [value]
+    if isinstance(value, list) and value and all(_is_tool_call(c) for c in value):
+        return value
+    return None
+
+@metrics.instrument("parse")
+def try_parse_tool_calls(text: str):
+    """
+    Like try_parse_tool_call, but also accepts a JSON array of tool calls,
+    and JSON wrapped in prose or a code fence (the first tool call found).
+    Returns a non-empty list of calls, or None.
+    """
+    single = try_parse_tool_call(text)
+    if single:
+        return [single]
+    stripped = text.strip()
+    if stripped.startswith("[") and stripped.endswith("]"):
+        try:
+            calls = _as_tool_calls(json.loads(stripped))
+        except ValueError:
+            calls = None
+        if calls:
+            return calls
+    for value, _ in iter_json_values(text):
+        calls = _as_tool_calls(value)
+        if calls:
+            return calls
+    return None
+
+tool_cache = ToolResultCache(max_entries=TOOL_CACHE_SIZE, ttl=TOOL_CACHE_TTL)
+
+# an incremental reload keeps every cached result whose inputs did not change
+functions.on_data_reload(
+    lambda old, new, diff: tool_cache.advance(old.version, new.version, functions.stale_deps(diff))
+)
+
 def run_tool(tool_name: str, args: dict):
     fn = getattr(functions, tool_name, None)
     if not fn:
+        metrics.observe("tool", "unknown", 0.0, error=True)
         return {"ok": False, "error": f"Unknown tool: {tool_name}"}
+
+    with metrics.timed("tool", tool_name) as t:
+        result = _run_tool_cached(tool_name, fn, args)
+        if metrics.enabled():
+            t.error = not result.get("ok", True)
+            if METRICS_TOOL_PAYLOADS:
+                t.payload_in = len(json.dumps(args, default=str))
+                t.payload_out = len(json.dumps(result, default=str))
+        return result
+
+def _run_tool_cached(tool_name: str, fn, args: dict):
+
+    key = None if tool_name in UNCACHED_TOOLS else make_key(tool_name, args)
+    if key is not None:
+        version = functions.data_version()
+        hit, cached = tool_cache.get(key, version)
+        if hit:
+            return cached
+
+    result = _call_tool(fn, args)
+    # only successful results are cached; errors are cheap and may be transient
+    if key is not None and result.get("ok", True):
+        tool_cache.put(key, version, result, functions.data_deps(tool_name, args))
+    return result
+
+_tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+def run_tools(tool_calls):
+    """Run the tool calls of one turn concurrently; results keep the call order."""
+    if len(tool_calls) == 1:
+        return [run_tool(tool_calls[0]["tool"], tool_calls[0]["args"])]
+    return list(_tool_pool.map(lambda c: run_tool(c["tool"], c["args"]), tool_calls))
+
+def _tool_results_message(tool_calls, results):
+    """
+    Follow-up user message carrying the tool results, or (None, error_text)
+    when nothing useful came back. Results are trimmed to TOOL_RESULT_TOKEN_BUDGET
+    (shared between the calls of a multi-tool turn).
+    """
+    if len(tool_calls) == 1:
+        if not results[0].get("ok", True):
+            return None, f"❌ Error: {results[0]['error']}"
+        result_json = summarize_tool_result(results[0], TOOL_RESULT_TOKEN_BUDGET)
+        return f"Tool result JSON:\n{result_json}\nNow answer the user in natural language.", None
+
+    if not any(r.get("ok", True) for r in results):
+        return None, "❌ Error: " + "; ".join(f"{c['tool']}: {r['error']}" for c, r in zip(tool_calls, results))
+    per_call = max(1, TOOL_RESULT_TOKEN_BUDGET // len(tool_calls))
+    combined = ",".join(
+        f'{{"tool":{json.dumps(c["tool"])},"args":{json.dumps(c["args"])},'
+        f'"result":{summarize_tool_result(r, per_call)}}}'
+        for c, r in zip(tool_calls, results)
+    )
+    return (
+        f"Tool results JSON (one entry per tool call):\n[{combined}]\n"
+        "Now answer all parts of the user's question in natural language.",
+        None
+    )
+
+def _history_messages(history):
+    """Earlier turns as chat messages; history is a ConversationHistory or a plain list."""
+    if history is None:
+        return []
+    if isinstance(history, ConversationHistory):
+        return history.messages()
+    return list(history)
+
+def _print_tool_calls(tool_calls):
+    for call in tool_calls:
+        print(f"\nTool requested: {call['tool']}")
+        print(f"Args: {call['args']}")
+
+def _call_tool(fn, args: dict):
     try:
         result = fn(**args)
         # لو في خطأ داخل الـ function، نرجع رسالة جاهزة بدل ما يطلع شرح طويل
@@ -82,33 +432,33 @@ def run_tool(tool_name: str, args: dict):
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-def chat_with_pseudo_tool_calling(user_prompt: str):
+def chat_with_pseudo_tool_calling(user_prompt: str, history=None):
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
+        *_history_messages(history),
         {"role": "user", "content": user_prompt}
     ]
 
-    # 1) Ask model
-    resp1 = call_ollama(messages)
-    assistant_text = resp1["message"]["content"]
-
-    # 2) If tool call JSON
-    tool_call = try_parse_tool_call(assistant_text)
-    if tool_call:
-        tool_name = tool_call["tool"]
-        args = tool_call["args"]
+    # 1) Route obvious requests directly, otherwise ask model
+    tool_calls, assistant_text = _route(user_prompt)
+    if tool_calls is None:
+        resp1 = call_ollama(messages)
+        assistant_text = resp1["message"]["content"]
 
-        print(f"\nTool requested: {tool_name}")
-        print(f"Args: {args}")
+        # 2) If tool call JSON (one call or an array of independent calls)
+        tool_calls = try_parse_tool_calls(assistant_text)
+    if tool_calls:
+        _print_tool_calls(tool_calls)
 
-        tool_result = run_tool(tool_name, args)
+        tool_results = run_tools(tool_calls)
         # إذا كانت النتيجة مش ناجحة، رجّع الرد المناسب
-        if not tool_result["ok"]:
-            return f"❌ Error: {tool_result['error']}"
+        followup, error_text = _tool_results_message(tool_calls, tool_results)
+        if error_text:
+            return error_text
         
-        # 3) Send tool result back to model
+        # 3) Send all tool results back to model in one message
         messages.append({"role": "assistant", "content": assistant_text})
-        messages.append({"role": "user", "content": f"Tool result JSON:\n{json.dumps(tool_result)}\nNow answer the user in natural language."})
+        messages.append({"role": "user", "content": followup})
 
         resp2 = call_ollama(messages)
         return resp2["message"]["content"]
@@ -116,17 +466,86 @@ def chat_with_pseudo_tool_calling(user_prompt: str):
     # 4) Otherwise normal answer
     return assistant_text
 
+async def achat_with_pseudo_tool_calling(user_prompt: str, on_token=None, history=None, priority="interactive"):
+    """
+    Async version of chat_with_pseudo_tool_calling.
+    Many conversations can run concurrently on one event loop; tools run in
+    the loop's default executor. If on_token is given, the final answer is
+    streamed to it chunk by chunk (the full text is still returned).
+    history: earlier turns of this conversation, a ConversationHistory or a
+    list of {"role","content"} messages (not modified).
+    priority: "interactive" (a person is waiting) or "batch"; model calls
+    are queued in `scheduler` by it.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *_history_messages(history),
+        {"role": "user", "content": user_prompt}
+    ]
+
+    # 1) Route obvious requests directly, otherwise ask model
+    #    (routing reply is JSON, so it is not streamed)
+    tool_calls, assistant_text = _route(user_prompt)
+    if tool_calls is None and STREAM_ROUTING:
+        # 2) tools start as soon as the reply's tool call JSON is complete;
+        #    identical prompts (e.g. the same first question on many tablets) share one call
+        assistant_text, tool_calls = await aroute_ollama(messages, priority)
+    elif tool_calls is None:
+        resp1 = await acall_ollama(messages, priority, coalesce=True)
+        assistant_text = resp1["message"]["content"]
+
+        # 2) If tool call JSON (one call or an array of independent calls)
+        tool_calls = try_parse_tool_calls(assistant_text)
+    if tool_calls:
+        _print_tool_calls(tool_calls)
+
+        tool_results = await asyncio.gather(
+            *(asyncio.to_thread(run_tool, c["tool"], c["args"]) for c in tool_calls)
+        )
+        followup, error_text = _tool_results_message(tool_calls, tool_results)
+        if error_text:
+            if on_token is not None:
+                on_token(error_text)
+            return error_text
+
+        # 3) Send all tool results back to model in one message
+        messages.append({"role": "assistant", "content": assistant_text})
+        messages.append({"role": "user", "content": followup})
+
+        if on_token is None:
+            resp2 = await acall_ollama(messages, priority)
+            return resp2["message"]["content"]
+
+        return await astream_ollama(messages, on_token, priority)
+
+    # 4) Otherwise normal answer
+    if on_token is not None:
+        on_token(assistant_text)
+    return assistant_text
+
 # ---------------------------
 # Chat loop
 # ---------------------------
 
-if __name__ == "__main__":
+def _print_token(chunk: str):
+    print(chunk, end="", flush=True)
+
+async def main():
     print("\nSenioCare Chat (type 'exit' or 'x' to quit)\n")
+    history = ConversationHistory(max_tokens=HISTORY_TOKEN_BUDGET)
+
+    try:
+        while True:
+            user_input = await asyncio.to_thread(input, "You: ")
+            if user_input.lower() == "exit" or user_input.lower() == "x":
+                break
 
-    while True:
-        user_input = input("You: ")
-        if user_input.lower() == "exit" or user_input.lower() == "x":
-            break
+            print("\nSenioCare:")
+            answer = await achat_with_pseudo_tool_calling(user_input, on_token=_print_token, history=history)
+            history.add_exchange(user_input, answer)
+            print("\n", 50*"=","\n")
+    finally:
+        await get_async_client().close()
 
-        answer = chat_with_pseudo_tool_calling(user_input)
-        print("\nSenioCare:\n", answer,"\n",50*"=","\n")
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
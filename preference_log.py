@@ -0,0 +1,203 @@
+import argparse
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------------------------
+# Append-only JSON Lines preference log
+# ---------------------------
+# One record per line. Writers append under an OS file lock, so concurrent
+# sessions / processes never lose each other's records, and a write costs
+# O(record) instead of rewriting the whole file. The lock is taken on a
+# `<log>.lock` sidecar rather than the log itself, so compact() can replace
+# the log while holding it (Windows refuses to replace an open file).
+
+PREF_FILE = "user_preferences.jsonl"
+
+
+@contextmanager
+def _locked(f) -> Iterator[None]:
+    """Exclusive lock on an open file (released on exit)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _log_locked(path: str) -> Iterator[None]:
+    """Exclusive lock on the log at path, held on its .lock sidecar."""
+    with open(path + ".lock", "a", encoding="utf-8") as f:
+        with _locked(f):
+            yield
+
+
+class PreferenceLog:
+    """
+    batch_size > 1 buffers records in memory and appends them in one locked
+    write; call flush() (or close()) to force pending records out. Records
+    still pending when the interpreter exits are flushed then.
+    fsync=True makes every flush durable at the cost of a disk sync.
+    """
+
+    def __init__(self, path: str = PREF_FILE, batch_size: int = 1, fsync: bool = False):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.fsync = fsync
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        if self.batch_size > 1:
+            atexit.register(self.flush)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        data = "".join(line + "\n" for line in self._pending)
+        with _log_locked(self.path):
+            # opened under the lock, so this is never a file compact() is replacing
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        self._pending.clear()
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Stream records from disk one line at a time (malformed lines are skipped)."""
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # e.g. a torn line after a crash
+                if isinstance(record, dict):
+                    yield record
+
+    def query(
+        self,
+        item: Optional[str] = None,
+        preference_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Records matching item / preference_type (case-insensitive), oldest first."""
+        item_n = (item or "").strip().lower()
+        type_n = (preference_type or "").strip().lower()
+        out = []
+        for record in self.iter_records():
+            if item_n and str(record.get("item", "")).strip().lower() != item_n:
+                continue
+            if type_n and str(record.get("preference_type", "")).strip().lower() != type_n:
+                continue
+            out.append(record)
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrite the log keeping only the latest record per (item, preference_type)
+        and dropping malformed lines. Writers are blocked while it runs.
+        """
+        self.flush()
+        with _log_locked(self.path):
+            latest: Dict[Any, Dict[str, Any]] = {}
+            before = 0
+            for record in self.iter_records():
+                before += 1
+                key = (
+                    str(record.get("item", "")).strip().lower(),
+                    str(record.get("preference_type", "")).strip().lower()
+                )
+                latest.pop(key, None)  # re-insert so order follows the latest write
+                latest[key] = record
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as out:
+                for record in latest.values():
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.path)
+        return {"records_before": before, "records_after": len(latest)}
+
+    def import_json_array(self, json_path: str) -> int:
+        """Append records from the old user_preferences.json (a JSON array)."""
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        if not isinstance(records, list):
+            return 0
+        lines = [json.dumps(r, ensure_ascii=False) for r in records if isinstance(r, dict)]
+        with self._lock:
+            self._pending.extend(lines)
+            self._flush_locked()
+        return len(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SenioCare preference log maintenance")
+    parser.add_argument("--file", default=PREF_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compact", help="keep only the latest record per (item, preference_type)")
+    q = sub.add_parser("query", help="print matching records as JSON Lines")
+    q.add_argument("--item")
+    q.add_argument("--type", dest="preference_type")
+    q.add_argument("--limit", type=int)
+    imp = sub.add_parser("import", help="append records from an old JSON array file")
+    imp.add_argument("json_file", nargs="?", default="user_preferences.json")
+    args = parser.parse_args()
+
+    log = PreferenceLog(args.file)
+    if args.command == "compact":
+        print(json.dumps(log.compact()))
+    elif args.command == "query":
+        for record in log.query(args.item, args.preference_type, args.limit):
+            print(json.dumps(record, ensure_ascii=False))
+    elif args.command == "import":
+        print(json.dumps({"imported": log.import_json_array(args.json_file)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+from typing import Any, Dict, List, Optional
+
+# ---------------------------
+# Prompt size control: tool-result summaries and rolling chat history
+# ---------------------------
+# Token counts are estimated (~4 characters per token), which is close
+# enough to budget prompts for a local model without loading a tokenizer.
+
+CHARS_PER_TOKEN = 4
+
+# fields that cost tokens but rarely change the answer; dropped first under pressure
+LOW_VALUE_FIELDS = ("food_id", "barcode", "tip", "tags", "note", "query", "preferences", "product_names")
+
+# list caps tried in order until the result fits
+LIST_CAPS = (20, 10, 5, 3, 1)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _prune(obj: Any, list_cap: Optional[int], drop: frozenset) -> Any:
+    """Copy of obj without None/empty values and dropped keys, lists capped to list_cap."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k in drop or v is None or v == "" or v == [] or v == {}:
+                continue
+            if list_cap is not None and isinstance(v, list) and len(v) > list_cap:
+                out[k] = [_prune(x, list_cap, drop) for x in v[:list_cap]]
+                out[k + "_total"] = len(v)
+            else:
+                out[k] = _prune(v, list_cap, drop)
+        return out
+    if isinstance(obj, list):
+        items = obj if list_cap is None else obj[:list_cap]
+        return [_prune(x, list_cap, drop) for x in items]
+    return obj
+
+
+def summarize_tool_result(result: Any, max_tokens: int) -> str:
+    """
+    Compact JSON for a tool result that fits max_tokens (estimated):
+    1) drop null/empty values, 2) cap long lists (keeping "<key>_total"
+    counts), 3) drop low-value fields, 4) as a last resort a stub
+    {"ok": ..., "truncated": true, "summary": "<start of the compact JSON>"}.
+    The output always parses as JSON.
+    """
+    text = _dumps(result)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    drop: frozenset = frozenset()
+    for cap in (None,) + LIST_CAPS:
+        text = _dumps(_prune(result, cap, drop))
+        if estimate_tokens(text) <= max_tokens:
+            return text
+    for i in range(1, len(LOW_VALUE_FIELDS) + 1):
+        drop = frozenset(LOW_VALUE_FIELDS[:i])
+        text = _dumps(_prune(result, LIST_CAPS[-1], drop))
+        if estimate_tokens(text) <= max_tokens:
+            return text
+
+    stub: Dict[str, Any] = {"truncated": True}
+    if isinstance(result, dict) and "ok" in result:
+        stub = {"ok": result["ok"], "truncated": True}
+    max_chars = max_tokens * CHARS_PER_TOKEN - 1  # longest text estimate_tokens() lets through
+    # longest prefix of the text whose escaped form still fits
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(_dumps({**stub, "summary": text[:mid]})) <= max_chars:
+            lo = mid
+        else:
+            hi = mid - 1
+    return _dumps({**stub, "summary": text[:lo]})
+
+
+class ConversationHistory:
+    """
+    Multi-turn history kept under a token budget. When the budget is
+    exceeded the oldest turns are folded into a short running summary
+    (first characters of each turn), so recent turns stay verbatim.
+    """
+
+    def __init__(self, max_tokens: int = 1500, summary_tokens: int = 300, turn_chars: int = 160):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.turn_chars = turn_chars
+        self.turns: List[Dict[str, str]] = []
+        self.summary_lines: List[str] = []
+        self.compacted_turns = 0
+
+    def add(self, role: str, content: str) -> None:
+        self.turns.append({"role": role, "content": content})
+        self._compact()
+
+    def add_exchange(self, user_text: str, answer: str) -> None:
+        self.add("user", user_text)
+        self.add("assistant", answer)
+
+    def _tokens(self) -> int:
+        return sum(estimate_tokens(t["content"]) for t in self.turns) + self._summary_tokens()
+
+    def _summary_tokens(self) -> int:
+        return estimate_tokens("\n".join(self.summary_lines)) if self.summary_lines else 0
+
+    def _compact(self) -> None:
+        summary_cap = min(self.summary_tokens, self.max_tokens // 4)
+        # keep at least the latest exchange verbatim
+        while len(self.turns) > 2 and self._tokens() > self.max_tokens:
+            old = self.turns.pop(0)
+            line = " ".join(old["content"].split())
+            if len(line) > self.turn_chars:
+                line = line[:self.turn_chars] + "..."
+            self.summary_lines.append(f"{old['role'].capitalize()}: {line}")
+            self.compacted_turns += 1
+            while len(self.summary_lines) > 1 and self._summary_tokens() > summary_cap:
+                self.summary_lines.pop(0)
+
+    def messages(self) -> List[Dict[str, str]]:
+        out = []
+        if self.summary_lines:
+            out.append({
+                "role": "system",
+                "content": "Summary of earlier conversation:\n" + "\n".join(self.summary_lines)
+            })
+        out.extend(self.turns)
+        return out
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.summary_lines.clear()
+        self.compacted_turns = 0
@@ -0,0 +1,397 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_store import BaseIndex, normalize_text
+from food_search import FoodSearchIndex, short_grams, trigrams
+from nutrient_table import NUTRIENT_COLUMNS
+
+# ---------------------------
+# Memory-mapped binary snapshot backend
+# ---------------------------
+# A compiled, read-only copy of mock_data.json:
+#   - the nutrient columns as one fixed-width float64 matrix,
+#   - string tables (int64 offsets + UTF-8 bytes) for the original JSON of
+#     every record and for normalized names / categories / tags,
+#   - sorted key tables (CSR style: keys -> row lists) for every lookup the
+#     tools do, searched with bisect straight on the mapped bytes, including
+#     the word / tag / trigram tables behind search_foods.
+# Opening a snapshot only maps the file and reads a small header, so workers
+# start instantly and share the page cache instead of each parsing the JSON.
+# Records are decoded on access and the tools return the same shapes.
+#
+# Build one with:  python snapshot_store.py mock_data.json seniocare.snap
+# then set functions.DATA_FILE = "seniocare.snap".
+
+SNAPSHOT_EXTENSIONS = (".snap",)
+_MAGIC_PREFIX = b"SENIOCARE-SNAP"
+MAGIC = _MAGIC_PREFIX + b"3\n" # bumped whenever the section layout changes
+_ALIGN = 8
+_TAG_SEP = "\x1f"
+
+
+def _user_key(user_id: Any) -> str:
+    # JSON encoding keeps 1 and "1" distinct, like the dict index does
+    return json.dumps(user_id)
+
+
+# ---------------------------
+# Compile step
+# ---------------------------
+
+def _string_table(name: str, values: Iterable[str], sections: Dict[str, np.ndarray]) -> None:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    sections[name + ".offsets"] = offsets
+    sections[name + ".data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _key_index(name: str, pairs: Iterable[Tuple[str, int]], sections: Dict[str, np.ndarray]) -> None:
+    """Sorted unique keys plus, per key, its rows in ascending order."""
+    grouped: Dict[str, List[int]] = {}
+    for key, row in pairs:
+        grouped.setdefault(key, []).append(row)
+    keys = sorted(grouped)
+    starts = np.zeros(len(keys) + 1, dtype=np.int64)
+    rows: List[int] = []
+    for i, key in enumerate(keys):
+        rows.extend(sorted(set(grouped[key])))
+        starts[i + 1] = len(rows)
+    _string_table(name + ".keys", keys, sections)
+    sections[name + ".starts"] = starts
+    sections[name + ".rows"] = np.array(rows, dtype=np.int32)
+
+
+def compile_snapshot(json_path: str, snap_path: str) -> Dict[str, int]:
+    """Build a snapshot from a mock_data.json-shaped file (atomic replace)."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    foods = data.get("foods", [])
+    users = data.get("users", [])
+    drugs = data.get("drugs", [])
+    meal_plans = data.get("meal_plans", [])
+
+    sections: Dict[str, np.ndarray] = {}
+    for table, records in (("foods", foods), ("users", users), ("drugs", drugs), ("meal_plans", meal_plans)):
+        _string_table(table + ".doc", (json.dumps(r, ensure_ascii=False) for r in records), sections)
+
+    sections["foods.nutrients"] = np.array(
+        [[float(f.get(c, 0) or 0) for c in NUTRIENT_COLUMNS] for f in foods], dtype=np.float64
+    ).reshape(len(foods), len(NUTRIENT_COLUMNS))
+    names = [normalize_text(f.get("food_name")) for f in foods]
+    categories = [normalize_text(f.get("category")) for f in foods]
+    _string_table("foods.name_norm", names, sections)
+    _string_table("foods.category_norm", categories, sections)
+    _string_table(
+        "foods.tags_norm", (_TAG_SEP.join(normalize_text(t) for t in f.get("tags", [])) for f in foods), sections
+    )
+
+    _key_index("idx.food_name", ((n, row) for row, n in enumerate(names)), sections)
+    _key_index("idx.food_category", ((c, row) for row, c in enumerate(categories)), sections)
+    _key_index("idx.user", ((_user_key(u.get("user_id")), row) for row, u in enumerate(users)), sections)
+    _key_index("idx.drug_name", ((normalize_text(d.get("drug_name")), row) for row, d in enumerate(drugs)), sections)
+    _key_index(
+        "idx.avoid_food",
+        ((normalize_text(x), row) for row, d in enumerate(drugs) for x in d.get("avoid_foods", [])),
+        sections
+    )
+    _key_index(
+        "idx.meal_condition", ((normalize_text(p.get("condition")), row) for row, p in enumerate(meal_plans)), sections
+    )
+    # search tables (the name tiers reuse idx.food_name)
+    _key_index("idx.search_word", ((w, row) for row, n in enumerate(names) for w in n.split()), sections)
+    _key_index(
+        "idx.search_tag",
+        ((normalize_text(t), row) for row, f in enumerate(foods) for t in f.get("tags", [])),
+        sections
+    )
+    _key_index("idx.search_gram", ((g, row) for row, n in enumerate(names) for g in trigrams(n)), sections)
+    _key_index("idx.search_short", ((g, row) for row, n in enumerate(names) for g in short_grams(n)), sections)
+
+    # header: MAGIC, u64 length, JSON table of contents; then 8-byte aligned sections
+    toc: Dict[str, Any] = {}
+    offset = 0
+    for name, arr in sections.items():
+        toc[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({"format": 3, "sections": toc}).encode("utf-8")
+    base = -(-(len(MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+    tmp = snap_path + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        out.write(b"\0" * (base - out.tell()))
+        for name, arr in sections.items():
+            out.write(np.ascontiguousarray(arr).tobytes())
+            out.write(b"\0" * (-arr.nbytes % _ALIGN))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, snap_path)
+    return {"foods": len(foods), "users": len(users), "drugs": len(drugs), "meal_plans": len(meal_plans)}
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+class _StringTable(Sequence[str]):
+    """Strings decoded on access from mapped offsets / bytes."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+    def all(self) -> List[str]:
+        blob = self._data.tobytes()
+        offsets = self._offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class _KeyIndex:
+    def __init__(self, keys: _StringTable, starts: np.ndarray, rows: np.ndarray):
+        self._keys = keys
+        self._starts = starts
+        self._rows = rows
+
+    def rows(self, key: str) -> List[int]:
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._rows[self._starts[i]:self._starts[i + 1]].tolist()
+        return []
+
+    def first(self, key: str) -> Optional[int]:
+        rows = self.rows(key)
+        return rows[0] if rows else None
+
+    def count(self, key: str) -> int:
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return int(self._starts[i + 1] - self._starts[i])
+        return 0
+
+    def iter_rows(self, key: str, chunk: int = 256) -> Iterator[int]:
+        """rows(key) read lazily, so a caller stopping at `limit` skips the rest of a long posting list."""
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            for start in range(int(self._starts[i]), int(self._starts[i + 1]), chunk):
+                yield from self._rows[start:min(start + chunk, int(self._starts[i + 1]))].tolist()
+
+    def prefix_rows(self, prefix: str) -> Iterator[int]:
+        """Rows of every key starting with prefix, in (key, row) order."""
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            yield from self._rows[self._starts[i]:self._starts[i + 1]].tolist()
+            i += 1
+
+
+class _MappedSearchIndex(FoodSearchIndex):
+    """FoodSearchIndex whose lookup tables stay in the mapped file (nothing is built per process)."""
+
+    def __init__(self, names: _StringTable, categories: _StringTable, name: _KeyIndex,
+                 word: _KeyIndex, tag: _KeyIndex, gram: _KeyIndex, short: _KeyIndex):
+        self.names = names
+        self.categories = categories
+        self._name = name
+        self._word = word
+        self._tag = tag
+        self._gram = gram
+        self._short = short
+
+    def _exact_rows(self, q: str) -> Iterator[int]:
+        return iter(self._name.rows(q))
+
+    def _name_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._name.prefix_rows(q)
+
+    def _word_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._word.prefix_rows(q)
+
+    def _tag_prefix_rows(self, q: str) -> Iterator[int]:
+        return self._tag.prefix_rows(q)
+
+    def _gram_count(self, gram: str) -> int:
+        return self._gram.count(gram)
+
+    def _gram_rows(self, gram: str) -> Iterable[int]:
+        return self._gram.rows(gram)
+
+    def _short_rows(self, q: str) -> Iterator[int]:
+        return self._short.iter_rows(q)
+
+
+class SnapshotIndex(BaseIndex):
+    """Read-only view of one snapshot file; safe to share between threads."""
+
+    def __init__(self, path: str, version: int = 0):
+        self.path = path
+        self.version = version
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            if self._mm[:len(_MAGIC_PREFIX)] == _MAGIC_PREFIX:
+                raise ValueError(f"{path} is an outdated snapshot format; recompile it with: python snapshot_store.py")
+            raise ValueError(f"{path} is not a SenioCare snapshot")
+        (header_len,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        toc = json.loads(self._mm[start:start + header_len].decode("utf-8"))["sections"]
+        base = -(-(start + header_len) // _ALIGN) * _ALIGN
+
+        self._sections: Dict[str, np.ndarray] = {}
+        for name, info in toc.items():
+            dtype = np.dtype(info["dtype"])
+            count = int(np.prod(info["shape"])) if info["shape"] else 1
+            arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=base + info["offset"])
+            self._sections[name] = arr.reshape(info["shape"])
+
+        self._docs = {t: self._strings(t + ".doc") for t in ("foods", "users", "drugs", "meal_plans")}
+        self.nutrient_values: np.ndarray = self._sections["foods.nutrients"]
+        self._food_name = self._keys("idx.food_name")
+        self._food_category = self._keys("idx.food_category")
+        self._user = self._keys("idx.user")
+        self._drug_name = self._keys("idx.drug_name")
+        self._avoid_food = self._keys("idx.avoid_food")
+        self._meal_condition = self._keys("idx.meal_condition")
+        # lookups run on the mapped search tables; nothing is built per process
+        self._search = _MappedSearchIndex(
+            self._strings("foods.name_norm"),
+            self._strings("foods.category_norm"),
+            self._food_name,
+            self._keys("idx.search_word"),
+            self._keys("idx.search_tag"),
+            self._keys("idx.search_gram"),
+            self._keys("idx.search_short")
+        )
+
+    def _strings(self, name: str) -> _StringTable:
+        return _StringTable(self._sections[name + ".offsets"], self._sections[name + ".data"])
+
+    def _keys(self, name: str) -> _KeyIndex:
+        return _KeyIndex(self._strings(name + ".keys"), self._sections[name + ".starts"], self._sections[name + ".rows"])
+
+    def _doc(self, table: str, row: Optional[int]) -> Optional[Dict[str, Any]]:
+        return json.loads(self._docs[table][row]) if row is not None else None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return {table: [json.loads(doc) for doc in docs.all()] for table, docs in self._docs.items()}
+
+    def get_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        return self._doc("users", self._user.first(_user_key(user_id)))
+
+    def find_food(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc("foods", self._food_name.first(normalize_text(name)))
+
+    def all_foods(self) -> List[Dict[str, Any]]:
+        return [json.loads(doc) for doc in self._docs["foods"].all()]
+
+    def food_columns(self) -> Tuple[List[str], List[str], Dict[str, List[int]], np.ndarray]:
+        tags: Dict[str, List[int]] = {}
+        for row, joined in enumerate(self._strings("foods.tags_norm").all()):
+            for tag in sorted(set(joined.split(_TAG_SEP))) if joined else ():
+                tags.setdefault(tag, []).append(row)
+        return (
+            self._strings("foods.name_norm").all(),
+            self._strings("foods.category_norm").all(),
+            tags,
+            self.nutrient_values
+        )
+
+    def food_names(self, rows: Sequence[int]) -> List[Optional[str]]:
+        docs = self._docs["foods"]
+        return [json.loads(docs[r]).get("food_name") for r in rows]
+
+    def foods_in_category(self, category: Optional[str]) -> List[Dict[str, Any]]:
+        docs = self._docs["foods"]
+        return [json.loads(docs[r]) for r in self._food_category.rows(normalize_text(category))]
+
+    def get_drug(self, drug_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc("drugs", self._drug_name.first(normalize_text(drug_name)))
+
+    def interactions_for_food(self, food_name: Optional[str]) -> List[Tuple[str, str]]:
+        out = []
+        for row in self._avoid_food.rows(normalize_text(food_name)):
+            d = self._doc("drugs", row)
+            out.append((d.get("drug_name"), d.get("notes", "")))
+        return out
+
+    def meal_plan_for_condition(self, condition: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc("meal_plans", self._meal_condition.first(normalize_text(condition)))
+
+    def search_index(self) -> FoodSearchIndex:
+        return self._search
+
+    def search_foods(self, query: str, category: Optional[str], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+        rows = self.search_index().search(query, category=category, limit=limit, fuzzy=fuzzy)
+        docs = self._docs["foods"]
+        return [json.loads(docs[r]) for r in rows]
+
+    def food_nutrients(self, names: List[Optional[str]]) -> Tuple[List[Optional[Dict[str, Any]]], np.ndarray]:
+        docs = self._docs["foods"]
+        foods: List[Optional[Dict[str, Any]]] = []
+        rows: List[int] = []
+        for n in names:
+            row = self._food_name.first(normalize_text(n))
+            foods.append(json.loads(docs[row]) if row is not None else None)
+            if row is not None:
+                rows.append(row)
+        return foods, self.nutrient_values[np.array(rows, dtype=np.intp)]
+
+
+class SnapshotStore:
+    """Counterpart of data_store.DataStore for a snapshot file (remapped when the file is replaced)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._current: Optional[Tuple[Tuple, SnapshotIndex]] = None
+        self._loads = 0
+
+    def _stat_signature(self) -> Tuple:
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def index(self) -> SnapshotIndex:
+        sig = self._stat_signature()
+        current = self._current
+        if current is not None and current[0] == sig:
+            return current[1]
+        with self._lock:
+            current = self._current
+            if current is None or current[0] != sig:
+                self._loads += 1
+                current = (sig, SnapshotIndex(self.path, version=self._loads))
+                self._current = current
+            return current[1]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._current = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile mock_data.json into a memory-mapped snapshot")
+    parser.add_argument("json_file", nargs="?", default="mock_data.json")
+    parser.add_argument("snap_file", nargs="?", default="seniocare.snap")
+    args = parser.parse_args()
+    print(json.dumps(compile_snapshot(args.json_file, args.snap_file)))
+
+
+if __name__ == "__main__":
+    main()
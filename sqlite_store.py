@@ -0,0 +1,427 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_store import BaseIndex, normalize_text
+from food_search import default_max_edits, fuzzy_rows, short_grams, trigrams
+from nutrient_table import NUTRIENT_COLUMNS
+
+# ---------------------------
+# SQLite storage backend
+# ---------------------------
+# Same read API as data_store.DataIndex, but every lookup is an indexed
+# query, so memory stays bounded however large the food catalogue is.
+# Each record keeps its original JSON in a `doc` column, so the tools
+# return exactly the same shapes as with mock_data.json.
+#
+# Build a database with:  python sqlite_store.py mock_data.json seniocare.db
+# then set functions.DATA_FILE = "seniocare.db".
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE foods (
+    id INTEGER PRIMARY KEY,
+    name_norm TEXT NOT NULL,
+    category_norm TEXT NOT NULL,
+    calories REAL NOT NULL,
+    total_carbs REAL NOT NULL,
+    sugars REAL NOT NULL,
+    protein REAL NOT NULL,
+    fiber REAL NOT NULL,
+    sodium REAL NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX foods_name ON foods(name_norm, id);
+CREATE INDEX foods_category ON foods(category_norm, id);
+
+CREATE TABLE food_tags (food_id INTEGER NOT NULL, tag_norm TEXT NOT NULL);
+CREATE INDEX food_tags_tag ON food_tags(tag_norm, food_id);
+
+CREATE TABLE food_words (food_id INTEGER NOT NULL, word TEXT NOT NULL);
+CREATE INDEX food_words_word ON food_words(word, food_id);
+
+CREATE TABLE food_grams (food_id INTEGER NOT NULL, gram TEXT NOT NULL);
+CREATE INDEX food_grams_gram ON food_grams(gram, food_id);
+CREATE TABLE food_gram_counts (gram TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID;
+
+CREATE TABLE food_short_grams (food_id INTEGER NOT NULL, gram TEXT NOT NULL);
+CREATE INDEX food_short_grams_gram ON food_short_grams(gram, food_id);
+
+CREATE TABLE users (id INTEGER PRIMARY KEY, user_key TEXT NOT NULL, doc TEXT NOT NULL);
+CREATE INDEX users_key ON users(user_key, id);
+
+CREATE TABLE user_medications (user_id INTEGER NOT NULL, med_norm TEXT NOT NULL);
+CREATE INDEX user_medications_med ON user_medications(med_norm, user_id);
+
+CREATE TABLE drugs (id INTEGER PRIMARY KEY, name_norm TEXT NOT NULL, drug_name TEXT, notes TEXT, doc TEXT NOT NULL);
+CREATE INDEX drugs_name ON drugs(name_norm, id);
+
+CREATE TABLE drug_avoid_foods (drug_id INTEGER NOT NULL, food_norm TEXT NOT NULL);
+CREATE INDEX drug_avoid_foods_food ON drug_avoid_foods(food_norm, drug_id);
+
+CREATE TABLE meal_plans (id INTEGER PRIMARY KEY, condition_norm TEXT NOT NULL, doc TEXT NOT NULL);
+CREATE INDEX meal_plans_condition ON meal_plans(condition_norm, id);
+"""
+
+
+def _user_key(user_id: Any) -> str:
+    # JSON encoding keeps 1 and "1" distinct, like the dict index does
+    return json.dumps(user_id)
+
+
+def _prefix_end(prefix: str) -> str:
+    return prefix + "\U0010ffff"
+
+
+def import_json(json_path: str, db_path: str) -> Dict[str, int]:
+    """Build a fresh SQLite database from a mock_data.json-shaped file (atomic replace)."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    tmp = db_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        for row, f in enumerate(data.get("foods", [])):
+            conn.execute(
+                "INSERT INTO foods VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row, normalize_text(f.get("food_name")), normalize_text(f.get("category")),
+                 *(float(f.get(c, 0) or 0) for c in NUTRIENT_COLUMNS),
+                 json.dumps(f, ensure_ascii=False))
+            )
+            conn.executemany(
+                "INSERT INTO food_tags VALUES (?, ?)",
+                [(row, t) for t in sorted({normalize_text(t) for t in f.get("tags", [])})]
+            )
+            conn.executemany(
+                "INSERT INTO food_words VALUES (?, ?)",
+                [(row, w) for w in sorted(set(normalize_text(f.get("food_name")).split()))]
+            )
+            conn.executemany(
+                "INSERT INTO food_grams VALUES (?, ?)",
+                [(row, g) for g in sorted(set(trigrams(normalize_text(f.get("food_name")))))]
+            )
+            conn.executemany(
+                "INSERT INTO food_short_grams VALUES (?, ?)",
+                [(row, g) for g in sorted(short_grams(normalize_text(f.get("food_name"))))]
+            )
+        # posting sizes, so picking the rarest trigram is a primary-key lookup per gram
+        conn.execute("INSERT INTO food_gram_counts SELECT gram, COUNT(*) FROM food_grams GROUP BY gram")
+        for row, u in enumerate(data.get("users", [])):
+            conn.execute("INSERT INTO users VALUES (?, ?, ?)",
+                         (row, _user_key(u.get("user_id")), json.dumps(u, ensure_ascii=False)))
+            conn.executemany(
+                "INSERT INTO user_medications VALUES (?, ?)",
+                [(row, m) for m in sorted({normalize_text(m) for m in u.get("medications", [])})]
+            )
+        for row, d in enumerate(data.get("drugs", [])):
+            conn.execute("INSERT INTO drugs VALUES (?, ?, ?, ?, ?)",
+                         (row, normalize_text(d.get("drug_name")), d.get("drug_name"), d.get("notes", ""),
+                          json.dumps(d, ensure_ascii=False)))
+            conn.executemany(
+                "INSERT INTO drug_avoid_foods VALUES (?, ?)",
+                [(row, x) for x in sorted({normalize_text(x) for x in d.get("avoid_foods", [])})]
+            )
+        for row, p in enumerate(data.get("meal_plans", [])):
+            conn.execute("INSERT INTO meal_plans VALUES (?, ?, ?)",
+                         (row, normalize_text(p.get("condition")), json.dumps(p, ensure_ascii=False)))
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+    return {k: len(data.get(k, [])) for k in ("foods", "users", "drugs", "meal_plans")}
+
+
+class SqliteIndex(BaseIndex):
+    """
+    Read-only view of one version of the database. Connections are opened
+    lazily, one per thread (sqlite3 connections can't be shared).
+    """
+
+    def __init__(self, path: str, version: int = 0):
+        self.path = path
+        self.version = version
+        self._local = threading.local()
+        self._has_grams = False  # checked on first use; older databases lack the tables
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _doc(self, sql: str, params: Tuple = ()) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            table: [json.loads(doc) for (doc,) in conn.execute(f"SELECT doc FROM {table} ORDER BY id")]
+            for table in ("foods", "users", "drugs", "meal_plans")
+        }
+
+    def get_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        return self._doc("SELECT doc FROM users WHERE user_key = ? ORDER BY id LIMIT 1", (_user_key(user_id),))
+
+    def find_food(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc("SELECT doc FROM foods WHERE name_norm = ? ORDER BY id LIMIT 1", (normalize_text(name),))
+
+    def all_foods(self) -> List[Dict[str, Any]]:
+        return [json.loads(doc) for (doc,) in self._conn().execute("SELECT doc FROM foods ORDER BY id")]
+
+    def food_columns(self) -> Tuple[List[str], List[str], Dict[str, List[int]], np.ndarray]:
+        # plain columns only: no record JSON is decoded
+        conn = self._conn()
+        names: List[str] = []
+        categories: List[str] = []
+        chunks: List[np.ndarray] = []
+        cur = conn.execute(f"SELECT name_norm, category_norm, {', '.join(NUTRIENT_COLUMNS)} FROM foods ORDER BY id")
+        while True:
+            rows = cur.fetchmany(10000)
+            if not rows:
+                break
+            names.extend(r[0] for r in rows)
+            categories.extend(r[1] for r in rows)
+            chunks.append(np.array([r[2:] for r in rows], dtype=np.float64))
+        values = np.concatenate(chunks) if chunks else np.zeros((0, len(NUTRIENT_COLUMNS)), dtype=np.float64)
+        tags: Dict[str, List[int]] = {}
+        for tag, row in conn.execute("SELECT tag_norm, food_id FROM food_tags ORDER BY tag_norm, food_id"):
+            tags.setdefault(tag, []).append(row)
+        return names, categories, tags, values
+
+    def food_names(self, rows: Sequence[int]) -> List[Optional[str]]:
+        wanted = sorted(set(rows))
+        found: Dict[int, Optional[str]] = {}
+        conn = self._conn()
+        for i in range(0, len(wanted), 500):  # stay under SQLite's bound-parameter limit
+            chunk = wanted[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            for row, doc in conn.execute(f"SELECT id, doc FROM foods WHERE id IN ({marks})", chunk):
+                found[row] = json.loads(doc).get("food_name")
+        return [found[r] for r in rows]
+
+    def foods_in_category(self, category: Optional[str]) -> Iterator[Dict[str, Any]]:
+        cur = self._conn().execute(
+            "SELECT doc FROM foods WHERE category_norm = ? ORDER BY id", (normalize_text(category),)
+        )
+        for (doc,) in cur:
+            yield json.loads(doc)
+
+    def get_drug(self, drug_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc("SELECT doc FROM drugs WHERE name_norm = ? ORDER BY id LIMIT 1", (normalize_text(drug_name),))
+
+    def interactions_for_food(self, food_name: Optional[str]) -> List[Tuple[str, str]]:
+        return self._conn().execute(
+            "SELECT d.drug_name, d.notes FROM drug_avoid_foods a JOIN drugs d ON d.id = a.drug_id "
+            "WHERE a.food_norm = ? ORDER BY d.id",
+            (normalize_text(food_name),)
+        ).fetchall()
+
+    def meal_plan_for_condition(self, condition: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._doc(
+            "SELECT doc FROM meal_plans WHERE condition_norm = ? ORDER BY id LIMIT 1", (normalize_text(condition),)
+        )
+
+    def _rows(self, sql: str, params: Tuple) -> Iterator[Tuple]:
+        # the query only runs once the caller starts reading this tier
+        yield from self._conn().execute(sql, params)
+
+    def _search_tiers(self, q: str, category: Optional[str]) -> List[Iterator[Tuple[int, str]]]:
+        cat_sql = " AND f.category_norm = ?" if category is not None else ""
+        cat_args: Tuple = (category,) if category is not None else ()
+        end = _prefix_end(q)
+        return [
+            self._rows(f"SELECT f.id, f.doc FROM foods f WHERE f.name_norm = ?{cat_sql} ORDER BY f.id",
+                         (q, *cat_args)),
+            self._rows(f"SELECT f.id, f.doc FROM foods f WHERE f.name_norm >= ? AND f.name_norm < ?{cat_sql} "
+                         "ORDER BY f.name_norm, f.id", (q, end, *cat_args)),
+            self._rows(f"SELECT f.id, f.doc FROM food_words w JOIN foods f ON f.id = w.food_id "
+                         f"WHERE w.word >= ? AND w.word < ?{cat_sql} ORDER BY w.word, f.id", (q, end, *cat_args)),
+            self._substring_rows(q, cat_sql, cat_args),
+            self._rows(f"SELECT f.id, f.doc FROM food_tags t JOIN foods f ON f.id = t.food_id "
+                         f"WHERE t.tag_norm >= ? AND t.tag_norm < ?{cat_sql} ORDER BY t.tag_norm, f.id",
+                         (q, end, *cat_args)),
+        ]
+
+    def _require_grams(self) -> None:
+        if not self._has_grams:
+            found = self._conn().execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('food_grams', 'food_gram_counts', 'food_short_grams')"
+            ).fetchone()
+            if found[0] < 3:
+                raise ValueError(
+                    f"{self.path} lacks the food search tables; rebuild it with: python sqlite_store.py"
+                )
+            self._has_grams = True
+
+    def _substring_rows(self, q: str, cat_sql: str, cat_args: Tuple) -> Iterator[Tuple[int, str]]:
+        self._require_grams()
+        if len(q) < 3:
+            # too short for trigrams: the 1-2 character postings are exactly the matches
+            yield from self._rows(
+                f"SELECT f.id, f.doc FROM food_short_grams g JOIN foods f ON f.id = g.food_id "
+                f"WHERE g.gram = ?{cat_sql} ORDER BY g.food_id",
+                (q, *cat_args)
+            )
+            return
+        grams = sorted(set(trigrams(q)))
+        counts = self._gram_counts(grams)
+        if len(counts) < len(grams):
+            return
+        # every match is in the rarest trigram's posting list
+        rarest = min(grams, key=lambda g: (counts[g], g))
+        yield from self._rows(
+            f"SELECT f.id, f.doc FROM food_grams g JOIN foods f ON f.id = g.food_id "
+            f"WHERE g.gram = ? AND instr(f.name_norm, ?) > 0{cat_sql} ORDER BY g.food_id",
+            (rarest, q, *cat_args)
+        )
+
+    def _gram_counts(self, grams: List[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        conn = self._conn()
+        for i in range(0, len(grams), 500):  # stay under SQLite's bound-parameter limit
+            chunk = grams[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            counts.update(conn.execute(
+                f"SELECT gram, n FROM food_gram_counts WHERE gram IN ({marks})", chunk
+            ))
+        return counts
+
+    def _gram_rows(self, gram: str) -> List[int]:
+        return [row for (row,) in self._conn().execute(
+            "SELECT food_id FROM food_grams WHERE gram = ? ORDER BY food_id", (gram,)
+        )]
+
+    def _fuzzy_rows(self, q: str, category: Optional[str], max_edits: int) -> Iterator[Tuple[int, str]]:
+        # same trigram candidates and ranking as food_search.FoodSearchIndex
+        self._require_grams()
+        conn = self._conn()
+        found: Dict[int, Tuple[str, str, str]] = {}
+
+        def names_of(rows: List[int]) -> List[str]:
+            marks = ", ".join("?" * len(rows))
+            for row, name, cat, doc in conn.execute(
+                f"SELECT id, name_norm, category_norm, doc FROM foods WHERE id IN ({marks})", rows
+            ):
+                found[row] = (name, cat, doc)
+            return [found[r][0] for r in rows]
+
+        for row, _ in fuzzy_rows(q, max_edits, self._gram_counts, self._gram_rows, names_of):
+            if category is None or found[row][1] == category:
+                yield row, found[row][2]
+
+    def _matches_any_category(self, q: str, category: Optional[str]) -> bool:
+        # a correct spelling outside the category is not retried as a typo
+        if category is None:
+            return False
+        return any(next(tier, None) is not None for tier in self._search_tiers(q, None))
+
+    def search_foods(self, query: str, category: Optional[str], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+        if not query:
+            tiers = [self._rows(
+                "SELECT id, doc FROM foods" + (" WHERE category_norm = ?" if category is not None else "")
+                + " ORDER BY id", (category,) if category is not None else ()
+            )]
+        else:
+            tiers = self._search_tiers(query, category)
+
+        seen = set()
+        out: List[Dict[str, Any]] = []
+        for tier in tiers:
+            for row, doc in tier:
+                if row in seen:
+                    continue
+                seen.add(row)
+                out.append(json.loads(doc))
+                if len(out) >= limit:
+                    return out
+
+        if not out and query and fuzzy and not self._matches_any_category(query, category):
+            for _, doc in self._fuzzy_rows(query, category, default_max_edits(query)):
+                out.append(json.loads(doc))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def food_nutrients(self, names: List[Optional[str]]) -> Tuple[List[Optional[Dict[str, Any]]], np.ndarray]:
+        wanted = sorted({normalize_text(n) for n in names})
+        found: Dict[str, Tuple[Dict[str, Any], Tuple[float, ...]]] = {}
+        conn = self._conn()
+        cols = ", ".join(NUTRIENT_COLUMNS)
+        for i in range(0, len(wanted), 500):  # stay under SQLite's bound-parameter limit
+            chunk = wanted[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            cur = conn.execute(
+                f"SELECT name_norm, doc, {cols} FROM foods WHERE name_norm IN ({marks}) ORDER BY id", chunk
+            )
+            for name, doc, *values in cur:
+                if name not in found:
+                    found[name] = (json.loads(doc), tuple(values))
+
+        foods: List[Optional[Dict[str, Any]]] = []
+        rows: List[Tuple[float, ...]] = []
+        for n in names:
+            hit = found.get(normalize_text(n))
+            foods.append(hit[0] if hit else None)
+            if hit:
+                rows.append(hit[1])
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), len(NUTRIENT_COLUMNS))
+        return foods, values
+
+
+class SqliteStore:
+    """Counterpart of data_store.DataStore for a SQLite database file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._current: Optional[Tuple[Tuple, SqliteIndex]] = None
+        self._loads = 0
+
+    def _stat_signature(self) -> Tuple:
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def index(self) -> SqliteIndex:
+        sig = self._stat_signature()
+        current = self._current
+        if current is not None and current[0] == sig:
+            return current[1]
+        with self._lock:
+            current = self._current
+            if current is None or current[0] != sig:
+                self._loads += 1
+                current = (sig, SqliteIndex(self.path, version=self._loads))
+                self._current = current
+            return current[1]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._current = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import mock_data.json into a SQLite database")
+    parser.add_argument("json_file", nargs="?", default="mock_data.json")
+    parser.add_argument("db_file", nargs="?", default="seniocare.db")
+    args = parser.parse_args()
+    print(json.dumps(import_json(args.json_file, args.db_file)))
+
+
+if __name__ == "__main__":
+    main()
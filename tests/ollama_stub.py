@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# ---------------------------
+# Stand-in for Ollama's /api/chat
+# ---------------------------
+# Serves the two response shapes the clients read ("stream": false -> one
+# JSON object, "stream": true -> NDJSON chunks) and lets a test script what
+# each request gets. Every request body is recorded in `requests`.
+#
+#   async with OllamaStub() as stub:
+#       stub.script = [{"status": 503}, {"content": "hi", "chunks": 2}]
+#       client = AsyncOllamaClient(stub.url, "test-model", ...)
+#
+# Script steps (consumed one per request; when empty, the reply echoes the
+# last user message):
+#   {"status": 503}            reply with that HTTP status
+#   {"delay": 1.0, ...}        wait before answering (client read timeouts)
+#   {"hold": asyncio.Event()}  wait until the test sets the event
+#   {"content": "...", "chunks": n}   reply text, streamed in n pieces
+#   {"error": "..."}           stream a chunk carrying an Ollama error
+#
+# Run it standalone to point ollama_integration.OLLAMA_URL at it:
+#   python tests/ollama_stub.py --port 11500 --reply '{"tool": "get_user_profile", "args": {"user_id": 1}}'
+
+
+class OllamaStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.reply = reply
+        self.script: List[Dict[str, Any]] = []
+        self.requests: List[Dict[str, Any]] = []
+        self.app = web.Application()
+        self.app.router.add_post("/api/chat", self.handle_chat)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/chat"
+
+    async def start(self) -> "OllamaStub":
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "OllamaStub":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def _default_content(self, body: Dict[str, Any]) -> str:
+        if self.reply is not None:
+            return self.reply
+        users = [m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"]
+        return users[-1] if users else ""
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests.append(body)
+        step = self.script.pop(0) if self.script else {}
+
+        if "hold" in step:
+            await step["hold"].wait()
+        if "delay" in step:
+            await asyncio.sleep(step["delay"])
+        if "status" in step:
+            return web.json_response({"error": f"stub status {step['status']}"}, status=step["status"])
+
+        content = step.get("content", self._default_content(body))
+        message = {"role": "assistant", "content": content}
+        if not body.get("stream"):
+            return web.json_response({"model": body.get("model"), "message": message, "done": True})
+
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        n = max(1, int(step.get("chunks", 1)))
+        size = -(-len(content) // n) if content else 0
+        for i in range(n):
+            piece = content[i * size:(i + 1) * size]
+            line = {"model": body.get("model"), "message": {"role": "assistant", "content": piece}, "done": False}
+            await resp.write((json.dumps(line) + "\n").encode("utf-8"))
+        if "error" in step:
+            await resp.write((json.dumps({"error": step["error"]}) + "\n").encode("utf-8"))
+        else:
+            await resp.write((json.dumps({"model": body.get("model"), "done": True}) + "\n").encode("utf-8"))
+        await resp.write_eof()
+        return resp
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in Ollama /api/chat server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--reply", default=None, help="fixed reply text (default: echo the last user message)")
+    args = parser.parse_args()
+    stub = OllamaStub(args.host, args.port, args.reply)
+    web.run_app(stub.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
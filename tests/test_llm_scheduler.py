@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+import ollama_integration
+from llm_scheduler import LLMScheduler
+from ollama_client import AsyncOllamaClient
+from ollama_stub import OllamaStub
+
+ROUTE_REPLY = json.dumps({"tool": "get_user_profile", "args": {"user_id": 1}})
+
+
+def _user(text):
+    return [{"role": "user", "content": text}]
+
+
+async def _wait_queued(scheduler, n):
+    while sum(scheduler.queue_depth().values()) < n:
+        await asyncio.sleep(0.01)
+
+
+def test_interactive_requests_go_before_queued_batch_requests():
+    async def scenario():
+        async with OllamaStub() as stub, AsyncOllamaClient(stub.url, "test-model", retries=0) as client:
+            scheduler = LLMScheduler(max_in_flight=1)
+            hold = asyncio.Event()
+            stub.script = [{"hold": hold}]
+
+            def call(text, priority):
+                return asyncio.ensure_future(scheduler.run(lambda: client.chat(_user(text)), priority))
+
+            tasks = [call("first", "interactive")]
+            while not stub.requests:
+                await asyncio.sleep(0.01)
+            tasks += [call("batch-1", "batch"), call("batch-2", "batch")]
+            await _wait_queued(scheduler, 2)
+            tasks.append(call("interactive", "interactive"))
+            await _wait_queued(scheduler, 3)
+            assert scheduler.queue_depth() == {"interactive": 1, "batch": 2}
+
+            hold.set()
+            await asyncio.gather(*tasks)
+            return [r["messages"][-1]["content"] for r in stub.requests], scheduler.stats()
+    order, stats = asyncio.run(scenario())
+    assert order == ["first", "interactive", "batch-1", "batch-2"]
+    assert stats["in_flight"] == 0
+
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    """Points ollama_integration's async path at a fresh stand-in server."""
+    def install(stub):
+        client = AsyncOllamaClient(stub.url, "test-model", retries=0)
+        monkeypatch.setattr(ollama_integration, "_async_client", client)
+        monkeypatch.setattr(ollama_integration, "scheduler", LLMScheduler(max_in_flight=2))
+        monkeypatch.setattr(ollama_integration, "COALESCE_ROUTING_CALLS", True)
+        return client
+    return install
+
+
+def test_identical_routing_calls_share_one_model_request(stub_backend):
+    async def scenario():
+        async with OllamaStub(reply=ROUTE_REPLY) as stub:
+            async with stub_backend(stub):
+                hold = asyncio.Event()
+                stub.script = [{"hold": hold, "chunks": 3}]
+                messages = _user("show my profile")
+                tasks = [asyncio.ensure_future(ollama_integration.aroute_ollama(messages)) for _ in range(4)]
+                while not stub.requests:
+                    await asyncio.sleep(0.01)
+                hold.set()
+                results = await asyncio.gather(*tasks)
+                return results, stub.requests, ollama_integration.scheduler.coalesced
+    results, requests, coalesced = asyncio.run(scenario())
+    assert len(requests) == 1
+    assert coalesced == 3
+    text, calls = results[0]
+    assert calls == [{"tool": "get_user_profile", "args": {"user_id": 1}}]
+    assert all(r == results[0] for r in results)
+
+
+def test_different_or_uncoalesced_routing_calls_are_sent_separately(stub_backend):
+    async def scenario():
+        async with OllamaStub(reply=ROUTE_REPLY) as stub:
+            async with stub_backend(stub):
+                await asyncio.gather(
+                    ollama_integration.aroute_ollama(_user("show my profile")),
+                    ollama_integration.aroute_ollama(_user("show my profile please")),
+                    ollama_integration.aroute_ollama(_user("show my profile"), coalesce=False)
+                )
+                return stub.requests
+    assert len(asyncio.run(scenario())) == 3
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from ollama_client import AsyncOllamaClient, OllamaError
+from ollama_stub import OllamaStub
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def _client(stub: OllamaStub, **kwargs) -> AsyncOllamaClient:
+    kwargs.setdefault("backoff", 0)
+    return AsyncOllamaClient(stub.url, "test-model", **kwargs)
+
+
+async def _collect(client: AsyncOllamaClient):
+    return [chunk async for chunk in client.chat_stream(MESSAGES)]
+
+
+def test_chat_retries_on_5xx():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub, retries=2) as client:
+            stub.script = [{"status": 503}, {"status": 502}, {"content": "ok"}]
+            resp = await client.chat(MESSAGES)
+            return resp, stub.requests
+    resp, requests = asyncio.run(scenario())
+    assert resp["message"]["content"] == "ok"
+    assert len(requests) == 3
+    assert requests[0]["stream"] is False
+
+
+def test_chat_gives_up_after_retries():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub, retries=1) as client:
+            stub.script = [{"status": 500}, {"status": 500}, {"content": "never read"}]
+            with pytest.raises(OllamaError, match="HTTP 500"):
+                await client.chat(MESSAGES)
+            return stub.requests
+    assert len(asyncio.run(scenario())) == 2
+
+
+def test_chat_does_not_retry_client_errors():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub, retries=3) as client:
+            stub.script = [{"status": 400}]
+            with pytest.raises(OllamaError, match="HTTP 400"):
+                await client.chat(MESSAGES)
+            return stub.requests
+    assert len(asyncio.run(scenario())) == 1
+
+
+def test_chat_retries_after_read_timeout():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub, retries=1, read_timeout=0.2) as client:
+            stub.script = [{"delay": 1.0}, {"content": "second try"}]
+            resp = await client.chat(MESSAGES)
+            return resp, stub.requests
+    resp, requests = asyncio.run(scenario())
+    assert resp["message"]["content"] == "second try"
+    assert len(requests) == 2
+
+
+def test_stream_yields_ndjson_chunks_in_order():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub) as client:
+            stub.script = [{"content": "Hello there, resident", "chunks": 4}]
+            chunks = await _collect(client)
+            return chunks, stub.requests
+    chunks, requests = asyncio.run(scenario())
+    assert len(chunks) == 4
+    assert "".join(chunks) == "Hello there, resident"
+    assert requests[0]["stream"] is True
+
+
+def test_stream_retries_before_the_first_chunk():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub, retries=1) as client:
+            stub.script = [{"status": 503}, {"content": "streamed", "chunks": 2}]
+            chunks = await _collect(client)
+            return chunks, stub.requests
+    chunks, requests = asyncio.run(scenario())
+    assert "".join(chunks) == "streamed"
+    assert len(requests) == 2
+
+
+def test_stream_error_chunk_raises():
+    async def scenario():
+        async with OllamaStub() as stub, _client(stub) as client:
+            stub.script = [{"content": "partial", "chunks": 1, "error": "model crashed"}]
+            with pytest.raises(OllamaError, match="model crashed"):
+                await _collect(client)
+    asyncio.run(scenario())
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import AbstractSet, Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+# ---------------------------
+# LRU + TTL cache for tool results
+# ---------------------------
+
+ALL_DATA: FrozenSet[str] = frozenset({"*"}) # deps of a result that may read anything in the data file
+
+
+def make_key(tool_name: str, args: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Canonical (tool, args) key; None if the args can't be serialized."""
+    try:
+        return (tool_name, json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False))
+    except (TypeError, ValueError):
+        return None
+
+
+class ToolResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+    Every entry remembers the data version it was computed from; a lookup
+    with a different version counts as a miss (and drops the entry if it is
+    older), so an edit to mock_data.json invalidates old results
+    automatically. Entries also name the parts of the data they read
+    (`deps`); after an incremental reload, advance() carries the unaffected
+    entries over to the new version.
+    Cached results are shared objects: treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, FrozenSet[str], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.carried_over = 0
+
+    def get(self, key: Hashable, version: int) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, entry_version, _, value = entry
+            if entry_version != version:
+                # a newer entry is kept: the caller is still on the previous data version
+                if entry_version < version:
+                    del self._entries[key]
+                    self.invalidations += 1
+                self.misses += 1
+                return False, None
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key: Hashable, version: int, value: Any, deps: AbstractSet[str] = ALL_DATA) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, frozenset(deps), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def advance(self, old_version: int, new_version: int, stale: AbstractSet[str]) -> int:
+        """
+        Move entries of `old_version` to `new_version` unless one of their deps
+        is in `stale` (or they depend on everything); those are dropped.
+        Returns the number of entries carried over.
+        """
+        with self._lock:
+            kept = 0
+            for key, (expires_at, version, deps, value) in list(self._entries.items()):
+                if version != old_version:
+                    continue
+                if "*" in deps or not deps.isdisjoint(stale):
+                    del self._entries[key]
+                    self.invalidations += 1
+                else:
+                    self._entries[key] = (expires_at, new_version, deps, value)
+                    kept += 1
+            self.carried_over += kept
+            return kept
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "carried_over": self.carried_over
+            }